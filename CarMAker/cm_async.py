@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from collections import deque
+
+from kuksa_client.grpc.aio import VSSClient as AsyncVSSClient  # Async Kuksa Library
+from fast_path import FastPathInput
+from startup import is_running
+
+
+class AsyncCarMaker:
+    """Non-blocking connection to the CarMaker APO command server.
+
+    Offers the part of the pycarmaker ``CarMaker`` interface used by
+    ``CarMakerController``, so the controller and its ``DVABatchWriter`` work
+    unchanged on top of it. ``send`` only queues the command on the socket and
+    returns immediately; the reply is consumed by a background task. Use
+    ``request`` to wait for the reply of a command, or ``send_then`` to have
+    it handed to a callback.
+    """
+
+    REPLY_TERMINATOR = b"\r\n\r\n"
+
+    def __init__(self, ip, port):
+        self.ip = ip
+        self.port = port
+        self.quantities = []
+        self.reader = None
+        self.writer = None
+        # One entry per command in flight: a future, a callback, or None to discard the reply
+        self.pending = deque()
+        self.reply_task = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.ip, self.port)
+        self.reply_task = asyncio.create_task(self.read_replies())
+
+    def subscribe(self, quantity):
+        self.quantities.append(quantity)
+
+    def send(self, msg):
+        """Queue a command without waiting for its reply."""
+        self.writer.write(msg.encode())
+        self.pending.append(None)
+
+    def send_then(self, msg, callback):
+        """Queue a command, ``callback(reply)`` is called on the event loop once CarMaker replied."""
+        self.writer.write(msg.encode())
+        self.pending.append(callback)
+
+    async def request(self, msg):
+        """Send a command and wait for CarMaker's reply."""
+        reply = asyncio.get_running_loop().create_future()
+        self.writer.write(msg.encode())
+        self.pending.append(reply)
+        await self.writer.drain()
+        return await reply
+
+    async def read_replies(self):
+        # CarMaker answers the commands of a connection in order
+        while True:
+            reply = (await self.reader.readuntil(self.REPLY_TERMINATOR)).decode().strip()
+            waiter = self.pending.popleft() if self.pending else None
+            if waiter is None:
+                logging.debug(f"CarMaker reply: {reply}")
+            elif isinstance(waiter, asyncio.Future):
+                if not waiter.done():
+                    waiter.set_result(reply)
+            else:
+                try:
+                    waiter(reply)
+                except Exception:
+                    logging.exception(f"Handling the reply of CarMaker at {self.ip}:{self.port} failed")
+
+    async def close(self):
+        if self.reply_task is not None:
+            self.reply_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def control_loop(fanout, scheduler):
+    """Write the latest values of every rig to CarMaker on every tick of ``scheduler``."""
+    scheduler.start()
+    while True:
+        fanout.write_all()
+        await scheduler.sleep_async()
+
+
+async def failsafe_loop(fanout, interval):
+    """Let the fail-safe of every rig take over from stale input, checked every ``interval`` seconds."""
+    while True:
+        fanout.write_all()
+        await asyncio.sleep(interval)
+
+
+async def wait_until_running(cm, timeout, interval=0.02):
+    """Poll SimStatus until the simulation runs, at most ``timeout`` seconds."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not is_running(await cm.request("SimStatus\r")):
+        if asyncio.get_running_loop().time() >= deadline:
+            logging.warning(f"CarMaker at {cm.ip}:{cm.port} is not running after {timeout:g}s, writing anyway")
+            return
+        await asyncio.sleep(interval)
+
+
+async def boot_rig(controller, boot_commands, ready_timeout, startup):
+    """Connect to one rig's CarMaker, start its simulation and wait until it runs."""
+    cm = controller.cm
+    await cm.connect()
+    if startup is not None:
+        startup.mark('carmaker_connected', controller.prefix)
+    for command in boot_commands:
+        logging.info(f"{cm.ip}:{cm.port} {command.strip()}: {await cm.request(command)}")
+    await wait_until_running(cm, ready_timeout)
+    controller.ready.set()
+    if startup is not None:
+        startup.mark('carmaker_running', controller.prefix)
+
+
+async def run_bridge(make_fanout, rigs, boot_commands, kuksa_ip, kuksa_port, scheduler=None, fast_path=None,
+                     feedback=None, ready_timeout=10.0, failsafe_interval=None):
+    """Run the KUKSA to CarMaker bridge on a single event loop.
+
+    ``make_fanout(connections)`` builds the same ``RigFanout``, controllers
+    and readers the threaded runtime uses on top of one ``AsyncCarMaker``
+    per rig; their threads are never started. The rigs boot concurrently
+    with each other and with the KUKSA connection and subscription; updates
+    that arrive meanwhile are merged and written once every simulation runs.
+    Each subscription update is handed to the fanout as it arrives and the
+    resulting DVA writes are queued on the non-blocking CarMaker sockets, so
+    nothing sleeps or polls while the inputs are idle and a slow CarMaker
+    does not hold up the other rigs. With a ``RateScheduler`` the writes
+    happen on its fixed-rate ticks instead; otherwise, with a
+    ``failsafe_interval``, the rigs are also checked for stale input that
+    often. With a ``fast_path`` (ip, port),
+    UDP fast path datagrams received there are handed to the fanout as well.
+    A ``FeedbackPublisher`` publishes the simulation state back to KUKSA.
+    When the connection to the broker drops, the same client reconnects and
+    subscribes again as the fanout's ``reconnect`` decides, while the rigs
+    keep running. A rig that fails to boot raises out of the bridge.
+    """
+    connections = [AsyncCarMaker(rig.carmaker_ip, rig.carmaker_port) for rig in rigs]
+    fanout = make_fanout(connections)
+    startup = fanout.startup
+    datagrams = []
+    tasks = []
+
+    async def subscribe(client):
+        subscribed = False
+        async for updates in client.subscribe_current_values(fanout.paths):
+            fanout.handle_updates(updates)
+            fanout.reconnect.succeeded()
+            if not subscribed:
+                subscribed = True
+                fanout.mark('kuksa_subscribed')
+
+    async def go_live():
+        await asyncio.shield(booting)  # Waiters must not cancel the boot
+        logging.info("CarMaker simulation is running. Ready to write data.")
+        fanout.go_live()
+        if scheduler is not None:
+            tasks.append(asyncio.create_task(control_loop(fanout, scheduler)))
+        elif failsafe_interval is not None:
+            tasks.append(asyncio.create_task(failsafe_loop(fanout, failsafe_interval)))
+        if fast_path is not None:
+            endpoint, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: FastPathInput(fanout.handle_updates, fanout.metrics, restarted=fanout.sender_restarted),
+                local_addr=fast_path)
+            datagrams.append(endpoint)
+
+    async def publish_feedback(client):
+        await asyncio.shield(booting)
+        try:
+            await feedback.run_async(client)
+        except Exception:
+            # Nobody awaits this task, the feedback stops until the next connection
+            logging.exception("Feedback publisher failed")
+
+    async def stay_connected(client):
+        while True:
+            feedback_task = None
+            try:
+                await client.connect()
+                fanout.reconnect.connected()
+                fanout.mark('kuksa_connected')
+                if feedback is not None:
+                    feedback_task = asyncio.create_task(publish_feedback(client))
+                await subscribe(client)
+                raise ConnectionError("The broker ended the subscription")
+            except Exception as e:
+                error = e
+            finally:
+                if feedback_task is not None:
+                    feedback_task.cancel()
+                await client.disconnect()
+            delay = fanout.reconnect.failed(error)
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+
+    try:
+        # Start the CarMaker simulations, and meanwhile connect and subscribe to KUKSA
+        booting = asyncio.gather(*(boot_rig(reader.car_maker_controller, boot_commands, ready_timeout, startup)
+                                   for reader in fanout.readers))
+        live = asyncio.create_task(go_live())
+        session = asyncio.create_task(stay_connected(AsyncVSSClient(kuksa_ip, kuksa_port)))
+        tasks.extend((booting, live, session))
+
+        # A rig that fails to boot ends the bridge, the KUKSA session alone would run on without writing
+        done, _ = await asyncio.wait((live, session), return_when=asyncio.FIRST_EXCEPTION)
+        if live in done and live.exception() is not None:
+            logging.critical(f"Starting the CarMaker simulations failed: {live.exception()!r}")
+            raise live.exception()
+        await session
+    finally:
+        for task in tasks:
+            task.cancel()
+        for endpoint in datagrams:
+            endpoint.close()
+        for cm in connections:
+            await cm.close()
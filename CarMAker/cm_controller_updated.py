@@ -1,145 +1,486 @@
 import os
 import time
+import asyncio
 import logging
 import threading
+from startup import StartupTimer, is_running  # Marks the launch time, import first
 from pycarmaker import CarMaker, Quantity  # CarMaker Library
-from kuksa_client.grpc import VSSClient  # Kuksa Library
+from dva_writer import DVABatchWriter
+import cm_async
+from metrics import Metrics
+from scheduler import RateScheduler
+from log_queue import TickLogger, setup_logging
+from latency_trace import LatencyTrace, SEQUENCE_SIGNAL
+from signal_map import LOG_FORMAT, NAMES, PATHS, compile_outputs, new_presses
+from rigs import Rig, RigFanout, metric_name, rig_paths
+from recording import Recording, replay
+from interpolation import Interpolator, sample_time, signal_limits
+from fast_path import FastPathInput, FastPathReceiver, is_newer
+from feedback import Feedback, FeedbackPublisher
+from reconnect import Reconnector
+from deadline import InputDeadline
 
 # Get the KUKSA data broker IP and port
 KUKSA_DATA_BROKER_IP = '20.79.188.178'  # Replace with your KUKSA server IP
 KUKSA_DATA_BROKER_PORT = 55555  # Default port for KUKSA
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO)
+# Reconnecting after the broker connection dropped: the first attempt is immediate, then with jittered
+# exponential backoff from RECONNECT_BASE_DELAY up to RECONNECT_MAX_DELAY seconds. Gives up after
+# RECONNECT_MAX_FAILURES failures without an update received in between, None retries forever.
+RECONNECT_BASE_DELAY = 0.05
+RECONNECT_MAX_DELAY = 5.0
+RECONNECT_MAX_FAILURES = None
 
-# Event to control when writing to CarMaker starts
-simulation_ready_event = threading.Event()
+# KUKSA signals forwarded to CarMaker, in signal table order.
+# The KUKSA to CarMaker mapping and scaling are configured in signal_map.SIGNALS.
+KUKSA_SIGNALS = list(PATHS)
+# Position of the enter button's press count, every press toggles continuous write mode
+ABS_PRESSES = NAMES.index('enter_presses')
+
+# CarMaker connection
+CARMAKER_IP = "localhost"  # Change if CarMaker is on a different machine
+CARMAKER_PORT = 16660  # Default CarMaker port
+
+# Unchanged quantities are left out of the DVA writes, but all are rewritten at most this often (seconds) on a
+# write, and on full-state updates from KUKSA that repeat the current values (the Minipc's heartbeats while the
+# wheel rests, a new subscription). Heals values CarMaker lost, e.g. when a TestRun restarts. None only rewrites
+# after a refused write and on those updates.
+DVA_REFRESH_INTERVAL = 1.0
+
+# CarMaker instances driven by this bridge: Rig(id, CarMaker IP, CarMaker port, VSS root of its signals).
+# All rigs share one KUKSA subscription; in the 'threads' runtime the CarMaker writes of several rigs
+# run on RIG_WORKERS threads so a slow CarMaker does not hold up the others (see WRITE_ON_CONTROLLER_THREAD).
+RIGS = [
+    Rig(None, CARMAKER_IP, CARMAKER_PORT, 'Vehicle'),
+    # Rig('rig2', CARMAKER_IP, 16661, 'Rig2'),  # Reads Rig2.Speed etc., metrics prefixed with 'rig2.'
+]
+RIG_WORKERS = 4
+
+# In the 'threads' runtime, let each rig's CarMakerController thread write the latest KUKSA values to CarMaker
+# at its own pace, so a slow CarMaker never stalls the subscription; updates that arrive meanwhile are merged
+# and counted in the updates_coalesced metric. False writes from the subscription thread (or RIG_WORKERS).
+WRITE_ON_CONTROLLER_THREAD = True
+
+# Also receive the joystick samples straight from the Minipc as UDP datagrams on this port when both are on one
+# LAN (FAST_PATH_TARGET there); None disables. Feeds the rigs on the 'Vehicle' root. The KUKSA updates keep
+# flowing and fill in for lost datagrams, samples already received over the fast path are dropped.
+FAST_PATH_PORT = None
+FAST_PATH_IP = '0.0.0.0'
+
+# Simulation state published back to KUKSA for the remote driver, as Feedback(CarMaker quantity, VSS path,
+# KUKSA data type, scale, deadband). All quantities of a rig are read with one command FEEDBACK_RATE_HZ times
+# per second (None disables); changes go out as one Set call, the full set every FEEDBACK_HEARTBEAT_INTERVAL.
+# Like in signal_map.SIGNALS, the VSS paths are stand-ins with a matching data type.
+FEEDBACK_SIGNALS = [
+    Feedback('Car.v', 'Vehicle.AverageSpeed', 'FLOAT', 3.6, 0.1),  # m/s to km/h
+    Feedback('PT.Engine.rotv', 'Vehicle.Powertrain.CombustionEngine.Speed', 'UINT16', 9.549, 10),  # rad/s to rpm
+    Feedback('PT.GearBox.GearNo', 'Vehicle.Powertrain.Transmission.CurrentGear', 'INT8', 1.0, 0),
+]
+FEEDBACK_RATE_HZ = 10
+FEEDBACK_HEARTBEAT_INTERVAL = 1.0
+
+# Commands that start the CarMaker simulation and wait until it is running
+CARMAKER_BOOT_COMMANDS = [
+    "::Cockpit::Close\r",
+    "::Cockpit::Popup\r",
+    "StartSim\r",
+    "WaitForStatus running\r",
+]
+SIM_READY_TIMEOUT = 10.0  # Seconds to wait for SimStatus to report the simulation running after the boot commands
+
+# 'asyncio' runs the bridge on one event loop with non-blocking sockets,
+# 'threads' runs the CarMakerControllers and the KUKSA subscription as separate threads,
+# 'replay' writes the recording at REPLAY_PATH straight to CarMaker, without KUKSA
+RUNTIME = 'asyncio'
+
+# Recording made by the Minipc (RECORD_PATH there), replayed REPLAY_SPEED times faster than recorded
+# (0 as fast as CarMaker accepts the writes)
+REPLAY_PATH = None
+REPLAY_SPEED = 1.0
+
+# Write to CarMaker at this fixed rate from the latest KUKSA values, None writes on every KUKSA update
+CONTROL_RATE_HZ = None
+
+# Smooth the stepped ~10 Hz KUKSA input: write the values INTERPOLATION_DELAY seconds behind the wheel,
+# interpolated between the samples on every control tick (needs CONTROL_RATE_HZ). Past the latest sample
+# the axes are extrapolated for at most INTERPOLATION_MAX_EXTRAPOLATION seconds. Gaps longer than
+# INTERPOLATION_MAX_GAP are taken as the values holding still. None disables the interpolation.
+INTERPOLATION_DELAY = None
+INTERPOLATION_MAX_EXTRAPOLATION = 0.1
+INTERPOLATION_MAX_GAP = 0.2
+INTERPOLATION_CLAMP = True  # Keep the axes within their range in signal_map.SIGNALS
+
+# Latency budget: updates older than LATENCY_BUDGET seconds on arrival (Minipc sample time to this host's clock,
+# needs both clocks in sync) are not written to CarMaker and are counted in deadline_misses. None writes them all.
+LATENCY_BUDGET = 0.5
+# Fail-safe: without an update within budget for STALE_TIMEOUT seconds, the signals of FAILSAFE_TARGETS ramp
+# from their last value to the target over FAILSAFE_RAMP_TIME seconds, the others hold. STALE_TIMEOUT must be
+# longer than the Minipc's HEARTBEAT_INTERVAL, it publishes nothing in between while the wheel rests.
+# Checked every FAILSAFE_CHECK_INTERVAL seconds, or on every control tick. None disables the fail-safe.
+STALE_TIMEOUT = 1.5
+FAILSAFE_TARGETS = {'gas': 0.0, 'brake': 0.3}
+FAILSAFE_RAMP_TIME = 0.5
+FAILSAFE_CHECK_INTERVAL = 0.05
+
+# Latency metrics: served as JSON on http://127.0.0.1:METRICS_PORT/metrics (None disables) and logged periodically
+METRICS_PORT = 9100
+METRICS_LOG_INTERVAL = 60.0
+
+# Per-write log line of the values sent to CarMaker: 'summary' (one line per TICK_LOG_INTERVAL seconds
+# and rig), 'debug' (every write, at DEBUG level), 'every' (every write at INFO) or 'off'
+TICK_LOGGING = 'summary'
+TICK_LOG_INTERVAL = 1.0
+
+# Initialize logging, the console is written from a background thread
+setup_logging(logging.INFO)
+
+# Counters and latency histograms of this bridge
+metrics = Metrics()
+# Times the startup phases from launch to the first write to CarMaker
+startup = StartupTimer(metrics)
 
 class CarMakerController(threading.Thread):
-    def __init__(self):
+    def __init__(self, cm=None, ip=CARMAKER_IP, port=CARMAKER_PORT, prefix=''):
         super().__init__()
-        self.carMaker_IP = "localhost"
-        self.carMaker_Port = 16660
-        self.cm = CarMaker(self.carMaker_IP, self.carMaker_Port)
+        self.carMaker_IP = ip
+        self.carMaker_Port = port
+        self.prefix = prefix  # Of the rig's metrics
+        self.ready = threading.Event()  # Set once the simulation is ready for data writing
+        # A CarMaker connection managed by the caller can be passed in, e.g. by the asyncio runtime,
+        # otherwise the thread connects when it starts
+        self.owns_connection = cm is None
+        self.cm = cm if cm is not None else CarMaker(self.carMaker_IP, self.carMaker_Port)
         self.is_running = True
+        self.reader = None  # KuksaReader whose updates this thread writes, None to only keep the simulation running
 
-        # Subscribe to CarMaker quantities
-        self.throttle_quantity = Quantity("DM.Gas", Quantity.FLOAT)
-        self.brake_quantity = Quantity("DM.Brake", Quantity.FLOAT)
-        self.steering_quantity = Quantity("DM.Steer.Ang", Quantity.FLOAT)
-        self.clutch_quantity = Quantity("DM.Clutch", Quantity.FLOAT)
-        self.handbrake_quantity = Quantity("DM.Handbrake", Quantity.FLOAT)
+        # Subscribe to the CarMaker quantities of the signal table,
+        # as (position in the KUKSA values, quantity, converter from the KUKSA value)
+        self.outputs = [(position, Quantity(name, Quantity.FLOAT), convert)
+                        for position, name, convert in compile_outputs()]
 
-        self.cm.connect()
-        self.cm.subscribe(self.throttle_quantity)
-        self.cm.subscribe(self.brake_quantity)
-        self.cm.subscribe(self.steering_quantity)
-        self.cm.subscribe(self.clutch_quantity)
-        self.cm.subscribe(self.handbrake_quantity)
+        if not self.owns_connection:
+            self.subscribe_outputs()
+
+        # Groups the DVA writes of a control tick into one command
+        self.writer = DVABatchWriter(self.cm, refresh_interval=DVA_REFRESH_INTERVAL)
+
+    def subscribe_outputs(self):
+        for _, quantity, _ in self.outputs:
+            self.cm.subscribe(quantity)
 
     def run(self):
+        # Connect and boot on this thread, while the KUKSA subscription starts up
+        if self.owns_connection:
+            self.cm.connect()
+            startup.mark('carmaker_connected', self.prefix)
+            self.subscribe_outputs()
+
         # Start CarMaker simulation and wait for it to be ready
-        print(self.cm.send("::Cockpit::Close\r"))
-        print(self.cm.send("::Cockpit::Popup\r"))
-        print(self.cm.send("StartSim\r"))
-        print(self.cm.send("WaitForStatus running\r"))  # Wait until CarMaker simulation is running
+        for command in CARMAKER_BOOT_COMMANDS:  # Ends with waiting until the simulation is running
+            logging.info(f"{command.strip()}: {self.cm.send(command)}")
+        self.wait_until_running()
 
-        simulation_ready_event.set()  # Signal that the simulation is ready for data writing
+        self.ready.set()  # Signal that the simulation is ready for data writing
+        startup.mark('carmaker_running', self.prefix)
         logging.info("CarMaker simulation is running. Ready to write data.")
 
+        # With a fail-safe, also write without an update every FAILSAFE_CHECK_INTERVAL, to let it take over
+        timeout = FAILSAFE_CHECK_INTERVAL if STALE_TIMEOUT is not None else 0.2
         while self.is_running:
-            time.sleep(0.2)  # Keep the thread alive
+            if self.reader is None:
+                time.sleep(0.2)  # Keep the thread alive
+            elif self.reader.wait_pending(timeout) or STALE_TIMEOUT is not None:
+                self.reader.write_pending()
 
-    def write_values(self, throttle, brake, steering, clutch, handbrake):
-        """Write KUKSA values to CarMaker."""
-        print(self.cm.DVA_write(self.throttle_quantity, throttle))  # Set throttle
-        print(self.cm.DVA_write(self.brake_quantity, brake))        # Set brake
-        print(self.cm.DVA_write(self.steering_quantity, steering))  # Set steering
-        print(self.cm.DVA_write(self.clutch_quantity, clutch))  
-        print(self.cm.DVA_write(self.handbrake_quantity, handbrake))
+    def wait_until_running(self, interval=0.02):
+        """Poll SimStatus until the simulation runs, at most SIM_READY_TIMEOUT seconds."""
+        deadline = time.monotonic() + SIM_READY_TIMEOUT
+        while not is_running(self.cm.send("SimStatus\r")):
+            if time.monotonic() >= deadline:
+                logging.warning(f"CarMaker at {self.carMaker_IP}:{self.carMaker_Port} is not running "
+                                f"after {SIM_READY_TIMEOUT:g}s, writing anyway")
+                return
+            time.sleep(interval)
+
+    def write_values(self, values):
+        """Write KUKSA values (one per signal, in signal table order) to CarMaker in a single batched command."""
+        self.writer.write([(quantity, convert(values[position])) for position, quantity, convert in self.outputs])
 
     def stop(self):
         self.is_running = False
 
-class KuksaReader(threading.Thread):
-    def __init__(self, car_maker_controller):
-        super().__init__()
+class KuksaReader:
+    """Merges the KUKSA updates of one rig and writes them to its CarMaker."""
+
+    def __init__(self, car_maker_controller, rig):
         self.car_maker_controller = car_maker_controller
-        self.is_running = True
+        self.rig = rig
+        # The rig's paths of the signal table, then the one of the sequence signal
+        self.subscribed = rig_paths(rig, KUKSA_SIGNALS + [SEQUENCE_SIGNAL])
+        self.positions = {path: position for position, path in enumerate(self.subscribed[:-1])}
+        self.values = [None] * len(KUKSA_SIGNALS)  # Last value received for every KUKSA signal
+        # Per-hop latencies from wheel sample to DVA write
+        self.trace = LatencyTrace(metrics, self.subscribed[-1], metric_name(rig, ''))
+        self.pending = None  # Trace of the latest update that still has to be written to CarMaker
+        self.lock = threading.Condition(threading.Lock())  # Guards values and pending against writes on another thread
+        self.write_lock = threading.Lock()
+        self.coalesced = metric_name(rig, 'updates_coalesced')
+        self.tick_log = TickLogger(("" if rig.id is None else f"{rig.id}: ") + LOG_FORMAT,
+                                   TICK_LOGGING, TICK_LOG_INTERVAL)
+        self.interpolator = None
+        if INTERPOLATION_DELAY is not None:
+            self.interpolator = Interpolator(INTERPOLATION_DELAY, INTERPOLATION_MAX_EXTRAPOLATION, INTERPOLATION_MAX_GAP,
+                                             signal_limits() if INTERPOLATION_CLAMP else None)
+        self.last_written = None  # Values of the last write to CarMaker, None before the first one
+        self.last_sequence = None  # Latest sample merged, with the fast path
+        self.refresh = False  # Whether the next write rewrites every quantity, after a repeated full state
+        self.stale = metric_name(rig, 'updates_stale')
+        # On a non-blocking CarMaker connection a write waits for the reply of the previous one
+        car_maker_controller.writer.on_reply = self.write_replied
+        self.deadline = InputDeadline(LATENCY_BUDGET, STALE_TIMEOUT, FAILSAFE_TARGETS, FAILSAFE_RAMP_TIME, metrics,
+                                      metric_name(rig, ''), "" if rig.id is None else f"{rig.id}: ")
         self.abs_engaged = False  # Tracks continuous write mode status
-        self.previous_abs_signal = 0  # Tracks the last `IsActive` state for transition detection
+        self.abs_presses = None  # Press count the toggle last acted on, None before the first one
+        self.toggles = metric_name(rig, 'abs_toggles')
 
-    def run(self):
-        with VSSClient(KUKSA_DATA_BROKER_IP, KUKSA_DATA_BROKER_PORT) as client:
-            # Subscribe to KUKSA signals
-            client.subscribe_current_values([
-                'Vehicle.OBD.RelativeThrottlePosition',
-                'Vehicle.ADAS.CruiseControl.SpeedSet',
-                'Vehicle.Speed',
-                'Vehicle.Chassis.Axle.Row1.Wheel.Right.Brake.PadWear',
-                'Vehicle.Chassis.Axle.Row2.Wheel.Left.Brake.PadWear',
-                'Vehicle.Powertrain.Transmission.ClutchEngagement',
-                'Vehicle.ADAS.CruiseControl.IsActive',  # New ABS active signal
-            ])
-            print("Subscribed to KUKSA signals...")
-
-            # Wait for CarMaker to be ready
-            simulation_ready_event.wait()  # Wait for the CarMaker simulation to be running
-            time.sleep(1)
-            while self.is_running:
-                # Get the current values for the subscribed signals
-                updates = client.get_current_values([
-                    'Vehicle.OBD.RelativeThrottlePosition',
-                    'Vehicle.ADAS.CruiseControl.SpeedSet',
-                    'Vehicle.Speed',
-                    'Vehicle.Chassis.Axle.Row1.Wheel.Right.Brake.PadWear',
-                    'Vehicle.Chassis.Axle.Row2.Wheel.Left.Brake.PadWear',
-                    'Vehicle.Powertrain.Transmission.ClutchEngagement',
-                    'Vehicle.ADAS.CruiseControl.IsActive',  # Check ABS engagement status
-                ])
-
-                # Check if continuous write mode should start or stop
-                abs_signal = updates['Vehicle.ADAS.CruiseControl.IsActive'].value
-                if abs_signal == 1 and self.previous_abs_signal == 0:
-                    # Engage or disengage continuous write mode on each 1 after a 0
+    def handle_updates(self, updates):
+        """Merge a subscription update, returns whether there are values to write to CarMaker."""
+        trace = self.trace.received(updates)
+        with self.lock:
+            # With the fast path, each sample arrives over UDP and over KUKSA: only the first copy is merged
+            sequence = trace[2]
+            if FAST_PATH_PORT is not None and sequence is None and len(updates) == len(self.values):
+                self.last_sequence = None  # The initial zeros of a (re)started Minipc, which counts from the start
+            elif FAST_PATH_PORT is not None and sequence is not None and sequence.value is not None:
+                if not is_newer(sequence.value, self.last_sequence):
+                    metrics.count(self.stale)
+                    # A copy still shows the input is alive: the KUKSA heartbeats of a wheel at rest repeat the
+                    # sequence number received over UDP. In time, it hands control back from the fail-safe.
+                    if self.deadline.arrived(updates, trace[0], copy=True) and self.deadline.engaged:
+                        self.pending = trace
+                        self.lock.notify()
+                        return True
+                    return False
+                self.last_sequence = sequence.value
+
+            in_time = self.deadline.arrived(updates, trace[0])
+            changed = False
+            values = self.values
+            for path, datapoint in updates.items():
+                if datapoint is None or datapoint.value is None:
+                    continue
+                position = self.positions[path]
+                if values[position] != datapoint.value:
+                    values[position] = datapoint.value
+                    changed = True
+
+            # Only act on updates within the latency budget, once every signal has been published at least once.
+            # While the fail-safe drives, an update in time hands control back even if nothing changed. A full
+            # state that changed nothing rewrites every quantity, so CarMaker gets back what it lost (fast path
+            # samples are full states too, but only sent when something changed).
+            full = len(updates) == len(values)
+            if not in_time or not (changed or full or self.deadline.engaged) or None in values:
+                return False
+            if full and not changed:
+                self.refresh = True
+
+            # Engage or disengage continuous write mode on each press, however many arrived in one update.
+            # The count seen first is where counting starts, presses from before the bridge started are ignored.
+            # A count that went back (a restarted Minipc) only becomes the new starting point.
+            presses = new_presses(values[ABS_PRESSES], self.abs_presses)
+            self.abs_presses = values[ABS_PRESSES]
+            if presses:
+                metrics.count(self.toggles, presses)
+                if presses % 2:
                     self.abs_engaged = not self.abs_engaged
+                    logging.info(f"{'' if self.rig.id is None else self.rig.id + ': '}Continuous write mode "
+                                 f"{'engaged' if self.abs_engaged else 'disengaged'}")
 
-                # Update the previous signal state
-                self.previous_abs_signal = abs_signal
+            # Write to CarMaker only if continuous write mode is active
+            if not self.abs_engaged:
+                return False
+            if self.interpolator is not None:
+                received = trace[0]
+                self.interpolator.add(sample_time(updates, received), received, values)
+            if self.pending is not None:
+                metrics.count(self.coalesced)  # Replaces an update that was not written yet
+            self.pending = trace
+            self.lock.notify()
+        return True
 
-                # Write to CarMaker if continuous write mode is active
-                if self.abs_engaged:
-                    # Map and send KUKSA signals to CarMaker
-                    throttle = updates['Vehicle.OBD.RelativeThrottlePosition'].value
-                    brake = updates['Vehicle.ADAS.CruiseControl.SpeedSet'].value
-                    steering = updates['Vehicle.Speed'].value
-                    clutch = updates['Vehicle.Powertrain.Transmission.ClutchEngagement'].value
-                    handbrake = updates['Vehicle.Chassis.Axle.Row1.Wheel.Right.Brake.PadWear'].value
+    def wait_pending(self, timeout):
+        """Wait until there is an update to write, returns whether there is one."""
+        with self.lock:
+            return self.lock.wait_for(lambda: self.pending is not None, timeout)
 
-                    self.car_maker_controller.write_values(throttle, brake, steering, clutch, handbrake)
+    def write_pending(self):
+        """Write the latest values to CarMaker, after updates or on every control tick."""
+        with self.write_lock:  # One write at a time, whichever thread calls
+            with self.lock:
+                if self.car_maker_controller.writer.busy:
+                    return  # Stays pending, written once CarMaker answered the previous write
+                trace, self.pending = self.pending, None
+                failsafe = self.deadline.failsafe(self.last_written, time.monotonic()) if self.abs_engaged else None
+                if failsafe is not None:
+                    # The input is stale, the fail-safe drives instead of the driver
+                    values, trace = failsafe, None
+                    if values == self.last_written:
+                        return
+                elif self.interpolator is not None:
+                    # Written on every tick while the interpolated values move
+                    values = self.interpolator.sample(time.time())
+                    if values is None or trace is None and values == self.last_written:
+                        return
+                elif trace is None:
+                    return
+                else:
+                    values = tuple(self.values)
+                first = self.last_written is None
+                self.last_written = values
+                refresh, self.refresh = self.refresh, False
 
-                    # Log the current state for debugging
-                    logging.info(f"Throttle: {throttle}, Brake: {brake}, Steering: {steering}, Clutch: {clutch}, Handbrake: {handbrake}")
+            if refresh:
+                self.car_maker_controller.writer.invalidate()
+            self.car_maker_controller.write_values(values)
+            if trace is not None:
+                self.trace.written(trace)
+            if first:
+                startup.mark('first_write', self.car_maker_controller.prefix)
 
-                time.sleep(0.1)  # Adjust delay for smooth control loop
+            # Log the current state for debugging
+            self.tick_log.log(*values)
 
-    def stop(self):
-        self.is_running = False
+    def sender_restarted(self):
+        # The fast path saw a new session, the samples of the previous one are no longer newer
+        with self.lock:
+            self.last_sequence = None
 
-if __name__ == '__main__':
-    car_maker_controller = CarMakerController()
-    kuksa_reader = KuksaReader(car_maker_controller)
+    def write_replied(self):
+        # CarMaker answered the previous write: the updates merged meanwhile go out as one write
+        if self.pending is not None:
+            self.write_pending()
 
-    car_maker_controller.start()  # Start CarMaker thread
-    kuksa_reader.start()  # Start KUKSA reader thread
+def build_fanout(connections=None):
+    """One CarMakerController and KuksaReader per rig, fed by one RigFanout.
+
+    ``connections`` are CarMaker connections managed by the caller, one per
+    rig, e.g. by the asyncio runtime; the controllers connect themselves
+    when started otherwise.
+    """
+    if INTERPOLATION_DELAY is not None and not CONTROL_RATE_HZ:
+        raise ValueError("INTERPOLATION_DELAY needs CONTROL_RATE_HZ, the interpolated values are written on its ticks")
+    readers = []
+    for index, rig in enumerate(RIGS):
+        cm = connections[index] if connections else None
+        controller = CarMakerController(cm, rig.carmaker_ip, rig.carmaker_port, metric_name(rig, ''))
+        readers.append(KuksaReader(controller, rig))
+    on_controllers = WRITE_ON_CONTROLLER_THREAD and connections is None and CONTROL_RATE_HZ is None
+    if on_controllers:
+        for reader in readers:
+            reader.car_maker_controller.reader = reader
+    workers = RIG_WORKERS if len(readers) > 1 and connections is None and not on_controllers else 0
+    reconnect = Reconnector('kuksa', metrics, RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, RECONNECT_MAX_FAILURES)
+    return RigFanout(readers, KUKSA_DATA_BROKER_IP, KUKSA_DATA_BROKER_PORT, metrics, workers,
+                     write_on_update=CONTROL_RATE_HZ is None and not on_controllers, startup=startup,
+                     reconnect=reconnect)
+
+def run_threads():
+    fanout = build_fanout()
+    car_maker_controllers = [reader.car_maker_controller for reader in fanout.readers]
+
+    for car_maker_controller in car_maker_controllers:
+        car_maker_controller.start()  # Start CarMaker threads
+    fanout.start()  # Start the KUKSA subscription thread
+    fast_path = None
+    feedback = None
+    if FEEDBACK_RATE_HZ:
+        feedback = FeedbackPublisher(FEEDBACK_SIGNALS, RIGS, KUKSA_DATA_BROKER_IP, KUKSA_DATA_BROKER_PORT,
+                                     FEEDBACK_RATE_HZ, metrics, FEEDBACK_HEARTBEAT_INTERVAL,
+                                     [car_maker_controller.ready for car_maker_controller in car_maker_controllers])
+        feedback.start()
 
     try:
-        while True:
-            time.sleep(0.1)  # Keep the main thread alive
+        # The KUKSA subscription starts while the simulations boot, its updates are written once all run
+        for car_maker_controller in car_maker_controllers:
+            car_maker_controller.ready.wait()
+        fanout.go_live()
+
+        if FAST_PATH_PORT is not None:
+            fast_path = FastPathReceiver(FastPathInput(fanout.handle_updates, metrics, restarted=fanout.sender_restarted),
+                                         FAST_PATH_IP, FAST_PATH_PORT)
+            fast_path.start()
+
+        if CONTROL_RATE_HZ:
+            # The main thread writes to CarMaker at the fixed control rate
+            scheduler = RateScheduler(CONTROL_RATE_HZ, 'control', metrics)
+            scheduler.start()
+            while True:
+                fanout.write_all()
+                scheduler.sleep()
+        elif STALE_TIMEOUT is not None and not WRITE_ON_CONTROLLER_THREAD:
+            # Lets the fail-safe take over from stale input, the CarMakerController threads check it themselves
+            while True:
+                fanout.write_all()
+                time.sleep(FAILSAFE_CHECK_INTERVAL)
+        else:
+            while True:
+                time.sleep(0.1)  # Keep the main thread alive
     except KeyboardInterrupt:
         print("\nKeyboardInterrupt caught. Stopping threads...")
+        for car_maker_controller in car_maker_controllers:
+            car_maker_controller.stop()
+        fanout.stop()
+        if fast_path is not None:
+            fast_path.stop()
+        if feedback is not None:
+            feedback.stop()
+        for car_maker_controller in car_maker_controllers:
+            car_maker_controller.join()
+        fanout.join()
+        print("Threads have been stopped.")
+
+def run_asyncio():
+    scheduler = RateScheduler(CONTROL_RATE_HZ, 'control', metrics) if CONTROL_RATE_HZ else None
+    fast_path = (FAST_PATH_IP, FAST_PATH_PORT) if FAST_PATH_PORT is not None else None
+    failsafe_interval = FAILSAFE_CHECK_INTERVAL if STALE_TIMEOUT is not None else None
+    feedback = None
+    if FEEDBACK_RATE_HZ:
+        feedback = FeedbackPublisher(FEEDBACK_SIGNALS, RIGS, KUKSA_DATA_BROKER_IP, KUKSA_DATA_BROKER_PORT,
+                                     FEEDBACK_RATE_HZ, metrics, FEEDBACK_HEARTBEAT_INTERVAL)
+    try:
+        asyncio.run(cm_async.run_bridge(
+            build_fanout, RIGS, CARMAKER_BOOT_COMMANDS, KUKSA_DATA_BROKER_IP, KUKSA_DATA_BROKER_PORT, scheduler,
+            fast_path, feedback, SIM_READY_TIMEOUT, failsafe_interval,
+        ))
+    except KeyboardInterrupt:
+        print("\nKeyboardInterrupt caught. Bridge has been stopped.")
+
+def run_replay():
+    recording = Recording(REPLAY_PATH, NAMES)
+    car_maker_controller = CarMakerController()
+    car_maker_controller.start()  # Boots the simulation
+    car_maker_controller.ready.wait()
+
+    try:
+        logging.info(f"Replaying {len(recording)} samples at speed {REPLAY_SPEED or 'max'}")
+        for elapsed, seq, values in replay(recording, REPLAY_SPEED):
+            car_maker_controller.write_values(values)
+        logging.info("Replay finished")
+    except KeyboardInterrupt:
+        print("\nKeyboardInterrupt caught. Stopping replay...")
+    finally:
         car_maker_controller.stop()
-        kuksa_reader.stop()
         car_maker_controller.join()
-        kuksa_reader.join()
-        print("Threads have been stopped.")
+        recording.close()
+
+if __name__ == '__main__':
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    metrics.log_every(METRICS_LOG_INTERVAL)
+
+    if RUNTIME == 'asyncio':
+        run_asyncio()
+    elif RUNTIME == 'replay':
+        run_replay()
+    else:
+        run_threads()
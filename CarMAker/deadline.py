@@ -0,0 +1,107 @@
+import time
+import logging
+
+from interpolation import sample_time
+from signal_map import NAMES
+
+
+class InputDeadline:
+    """Latency budget and fail-safe for the driver input of one rig.
+
+    Every update is aged on arrival, from the Minipc's sample time on its
+    datapoints to this host's wall time (a snapshot the Minipc sends again,
+    e.g. as heartbeat while the wheel rests, carries its publish time
+    instead), so the clocks need to be in sync (NTP) like for
+    ``publish_to_receive``. Updates older than ``budget`` seconds miss the
+    deadline and are not written to CarMaker. Their values are still merged,
+    so that the next update in time writes the current state even if the
+    Minipc only publishes what changed. Misses are logged with their age at
+    most once per ``miss_log_interval`` seconds: if every update misses, the
+    Minipc's clock is likely behind.
+
+    Without an update in time for ``stale_timeout`` seconds, the stream is
+    stale and ``failsafe`` takes over the values written: the signals named
+    in ``targets`` ramp from their last written value to the target over
+    ``ramp_time`` seconds, the others hold. The next update in time hands
+    control back to the driver. None disables the budget or the fail-safe.
+
+    Kept in ``metrics``, prefixed e.g. per rig: the histogram ``input_age``
+    and the counters ``deadline_misses`` and ``input_stale``. Log lines
+    start with ``label``. Not thread-safe, the caller locks.
+    """
+
+    def __init__(self, budget, stale_timeout, targets, ramp_time, metrics, prefix='', label='',
+                 miss_log_interval=10.0):
+        self.budget = budget
+        self.stale_timeout = stale_timeout
+        self.targets = tuple((NAMES.index(name), target) for name, target in targets.items())
+        self.ramp_time = ramp_time
+        self.metrics = metrics
+        self.prefix = prefix
+        self.label = label
+        self.age = metrics.histogram(prefix + 'input_age')
+        self.last_in_time = None  # time.monotonic() of the last update within budget
+        self.stale_since = None  # time.monotonic() the fail-safe took over, None while the input is in time
+        self.ramp_start = None  # Values written when the fail-safe took over
+        self.miss_log_interval = miss_log_interval
+        self.quiet_until = 0.0  # time.monotonic() before which misses are not logged
+        self.unlogged = 0  # Misses since the last log line
+
+    def arrived(self, updates, received, copy=False):
+        """Age an update received at ``received`` (wall time), returns whether it is within budget.
+
+        A ``copy`` of a sample already merged, e.g. the KUKSA copy of a fast
+        path sample, keeps the input in time but is not kept in the metrics.
+        """
+        sampled = sample_time(updates, None)
+        if sampled is not None:
+            age = received - sampled
+            if not copy:
+                self.age.record(age)
+            if self.budget is not None and age > self.budget:
+                if not copy:
+                    self.metrics.count(self.prefix + 'deadline_misses')
+                    self.log_miss(age)
+                return False
+        self.last_in_time = time.monotonic()
+        return True
+
+    def log_miss(self, age):
+        # At most one line per miss_log_interval, with a skewed clock every update misses
+        now = time.monotonic()
+        if now < self.quiet_until:
+            self.unlogged += 1
+            return
+        more = f" ({self.unlogged} more misses not logged)" if self.unlogged else ""
+        logging.warning(f"{self.label}Update {age * 1000:.0f} ms old on arrival, over the budget of "
+                        f"{self.budget * 1000:.0f} ms; check the clock sync if this repeats{more}")
+        self.unlogged = 0
+        self.quiet_until = now + self.miss_log_interval
+
+    @property
+    def engaged(self):
+        """Whether the fail-safe drives the values written."""
+        return self.stale_since is not None
+
+    def failsafe(self, last_written, now):
+        """The values to write instead of the driver's at ``now`` (monotonic), None while the input is in time."""
+        if self.stale_timeout is None or self.last_in_time is None or last_written is None:
+            return None
+        if now - self.last_in_time <= self.stale_timeout:
+            if self.stale_since is not None:
+                logging.info(f"{self.label}Input in time again after {now - self.stale_since:.1f}s of fail-safe")
+                self.stale_since = self.ramp_start = None
+            return None
+
+        if self.stale_since is None:
+            self.stale_since = now
+            self.ramp_start = last_written
+            self.metrics.count(self.prefix + 'input_stale')
+            logging.warning(f"{self.label}No input in time for {now - self.last_in_time:.1f}s, ramping "
+                            f"{', '.join(NAMES[position] for position, _ in self.targets)} to fail-safe")
+        fraction = min(1.0, (now - self.stale_since) / self.ramp_time) if self.ramp_time else 1.0
+        values = list(self.ramp_start)
+        for position, target in self.targets:
+            start = self.ramp_start[position]
+            values[position] = start + (target - start) * fraction
+        return tuple(values)
@@ -0,0 +1,69 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import time
+import logging
+
+
+class DeltaFilter:
+    """Select which signals need to be published to KUKSA.
+
+    A signal is only published when it moved further than its deadband from
+    the value last sent. Every ``heartbeat_interval`` seconds the full state
+    is sent regardless, so subscribers that joined late can resync. Signals
+    are referred to by their position in the signal table.
+    """
+
+    def __init__(self, deadbands, heartbeat_interval=1.0, report_interval=10.0, enabled=True, name='Delta publishing'):
+        self.deadbands = tuple(deadbands)  # Minimum change per signal
+        self.heartbeat_interval = heartbeat_interval
+        self.report_interval = report_interval
+        self.enabled = enabled
+        self.name = name  # Starts the report line
+        self.last_sent = [None] * len(self.deadbands)  # Last published value per signal
+        self.everything = tuple(range(len(self.deadbands)))
+        self.next_heartbeat = 0.0
+        self.next_report = time.monotonic() + report_interval
+        self.sent = 0  # Datapoints published
+        self.suppressed = 0  # Datapoints held back by the deadband
+        self.heartbeats = 0
+
+    def reset(self, values):
+        """Record values that were published outside of the filter."""
+        self.last_sent[:] = values
+        self.next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+    def resync(self):
+        """Select the full state next time, e.g. after a publish that may not have arrived."""
+        self.next_heartbeat = 0.0
+
+    def select(self, values):
+        """Return the positions of the ``values`` (one per signal) that should be published now."""
+        now = time.monotonic()
+        if not self.enabled or now >= self.next_heartbeat:
+            selected = self.everything
+            self.last_sent[:] = values
+            self.next_heartbeat = now + self.heartbeat_interval
+            self.heartbeats += 1
+        else:
+            selected = []
+            last_sent = self.last_sent
+            for position, deadband in enumerate(self.deadbands):
+                value = values[position]
+                last = last_sent[position]
+                if last is None or abs(value - last) > deadband:
+                    selected.append(position)
+                    last_sent[position] = value
+
+        self.sent += len(selected)
+        self.suppressed += len(self.deadbands) - len(selected)
+
+        if now >= self.next_report:
+            self.report()
+            self.next_report = now + self.report_interval
+        return selected
+
+    def report(self):
+        total = self.sent + self.suppressed
+        ratio = self.suppressed / total if total else 0.0
+        logging.info(f"{self.name}: sent {self.sent}, suppressed {self.suppressed} "
+                     f"({ratio:.0%}) datapoints, {self.heartbeats} heartbeats")
@@ -0,0 +1,84 @@
+import time
+import logging
+
+
+class DVABatchWriter:
+    """Send all DVA writes of one control tick to CarMaker as a single APO command.
+
+    CarMaker evaluates a command line as a Tcl script, so several ``DVAWrite``
+    commands joined with ``;`` cost one socket write and one reply instead of
+    one round-trip per quantity. Quantities whose value did not change since
+    the last write CarMaker accepted are left out, except every
+    ``refresh_interval`` seconds, when all are rewritten: CarMaker drops the
+    held values e.g. when a TestRun restarts. A refused batch is logged and
+    everything is rewritten next time.
+
+    A connection whose ``send`` returns before the reply arrives (like
+    ``AsyncCarMaker``) must offer ``send_then(command, callback)``; until its
+    reply arrives the writer is ``busy`` and ``on_reply`` is called after it.
+    """
+
+    def __init__(self, cm, duration=-1, mode="Abs", refresh_interval=1.0):
+        self.cm = cm
+        self.duration = duration
+        self.mode = mode
+        self.refresh_interval = refresh_interval
+        self.next_refresh = 0.0
+        self.last_written = {}  # Quantity name -> last value CarMaker accepted
+        self.busy = False  # Whether the reply of a batch is outstanding
+        self.on_reply = None  # Called once the reply of a batch sent with send_then arrived
+
+    def format_value(self, value):
+        # DVAWrite expects a number, booleans from KUKSA are sent as 0/1
+        return repr(float(value))
+
+    def write(self, pairs):
+        """Write the changed (quantity, value) pairs in one command. Returns the reply, None if there is none yet."""
+        if self.refresh_interval is not None:
+            now = time.monotonic()
+            if now >= self.next_refresh:
+                self.invalidate()
+                self.next_refresh = now + self.refresh_interval
+
+        commands = []
+        changed = []
+        for quantity, value in pairs:
+            if value is None or self.last_written.get(quantity.name) == value:
+                continue
+            commands.append(f"DVAWrite {quantity.name} {self.format_value(value)} {self.duration} {self.mode}")
+            changed.append((quantity.name, value))
+
+        if not commands:
+            return None
+
+        command = "; ".join(commands) + "\r"
+        send_then = getattr(self.cm, 'send_then', None)
+        if send_then is not None:
+            self.busy = True
+            send_then(command, lambda reply: self.replied(changed, reply))
+            return None
+        reply = self.cm.send(command)
+        self.accepted(changed, reply)
+        return reply
+
+    def replied(self, changed, reply):
+        self.busy = False
+        self.accepted(changed, reply)
+        if self.on_reply is not None:
+            self.on_reply()
+
+    def accepted(self, changed, reply):
+        # Only remember the values once CarMaker has accepted them
+        if isinstance(reply, bytes):
+            reply = reply.decode(errors='replace')
+        reply = (reply or '').strip()
+        if reply.startswith('O'):
+            self.last_written.update(changed)
+            logging.debug("DVA batch of %d quantities: %r", len(changed), reply)
+        else:
+            logging.error(f"CarMaker refused a DVA batch of {len(changed)} quantities: {reply!r}")
+            self.invalidate()
+
+    def invalidate(self):
+        """Forget what was written so the next tick rewrites every quantity."""
+        self.last_written.clear()
@@ -0,0 +1,145 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import time
+import random
+import socket
+import struct
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+
+from kuksa_client.grpc import Datapoint  # Kuksa Library
+from signal_map import PATHS, SEQUENCE_SIGNAL, SIGNALS
+
+# One datagram per joystick sample: magic, version, signal count, the sender's
+# session (uint32, random per FastPathSender), the sample's sequence number
+# (uint32), the time it was sampled and the time it was sent (float64 wall
+# clock seconds), then one float32 per signal in signal table order: 68 bytes
+# for the 10 G29 signals.
+MAGIC = b'GF'
+VERSION = 2
+DATAGRAM = struct.Struct(f'<2sBBIIdd{len(SIGNALS)}f')
+
+# Samples this far behind the latest one are late arrivals, further back the sender restarted
+REORDER_WINDOW = 1024
+
+# Back from the float32 of the datagram to the type KUKSA carries the signal as
+CONVERTERS = tuple(float if signal.vss_type in ('FLOAT', 'DOUBLE') else bool if signal.vss_type == 'BOOLEAN' else int
+                   for signal in SIGNALS)
+
+
+def is_newer(seq, last, window=REORDER_WINDOW):
+    """Whether sample ``seq`` comes after ``last``, the latest one seen (None for none yet)."""
+    return last is None or not last - window < seq <= last
+
+
+class FastPathSender:
+    """Send joystick samples straight to a CarMaker bridge on the LAN, one UDP datagram each.
+
+    Fire and forget: a datagram that cannot be sent is counted and dropped,
+    the next sample carries the full state again.
+    """
+
+    def __init__(self, host, port, metrics=None):
+        self.address = (host, port)
+        self.metrics = metrics
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        # A restarted sender counts its samples from the start again, the receiver tells by the new session
+        self.session = random.getrandbits(32)
+
+    def send(self, seq, sampled, values):
+        try:
+            self.socket.sendto(DATAGRAM.pack(MAGIC, VERSION, len(values), self.session, seq, sampled, time.time(),
+                                             *values), self.address)
+        except OSError as e:  # Full send buffer, or nothing listening on loopback
+            logging.debug(f"Fast path datagram {seq} not sent: {e}")
+            if self.metrics is not None:
+                self.metrics.count('fast_path_send_errors')
+
+    def close(self):
+        self.socket.close()
+
+
+class FastPathInput(asyncio.DatagramProtocol):
+    """Turn fast path datagrams into subscription-style updates for ``deliver``.
+
+    The updates look like the ones of a KUKSA subscription on ``paths``: a
+    ``Datapoint`` per signal stamped with the sample time, plus the sequence
+    signal stamped with the send time, so the readers and their latency
+    metrics handle both sources alike. Datagrams older than the latest one
+    are dropped. A datagram of a new session means the sender restarted: the
+    sequence starts over and ``restarted`` is called, before the datagram is
+    delivered. Counted in ``metrics``: ``fast_path_received``,
+    ``fast_path_lost`` (gaps in the sequence), ``fast_path_late`` (arrived
+    after a newer one, already counted as lost), ``fast_path_restarts`` and
+    ``fast_path_malformed``.
+
+    Serves as the protocol of an asyncio datagram endpoint, or is fed by a
+    ``FastPathReceiver`` thread.
+    """
+
+    def __init__(self, deliver, metrics, paths=PATHS, sequence_signal=SEQUENCE_SIGNAL, restarted=None):
+        self.deliver = deliver
+        self.metrics = metrics
+        self.paths = tuple(paths)
+        self.sequence_signal = sequence_signal
+        self.restarted = restarted
+        self.session = None
+        self.last_sequence = None
+
+    def datagram_received(self, data, address=None):
+        if len(data) != DATAGRAM.size:
+            self.metrics.count('fast_path_malformed')
+            return
+        magic, version, count, session, seq, sampled, sent, *values = DATAGRAM.unpack(data)
+        if magic != MAGIC or version != VERSION or count != len(self.paths):
+            self.metrics.count('fast_path_malformed')
+            return
+
+        self.metrics.count('fast_path_received')
+        if session != self.session:
+            if self.session is not None:
+                self.metrics.count('fast_path_restarts')
+                self.last_sequence = None
+                if self.restarted is not None:
+                    self.restarted()
+            self.session = session
+        last = self.last_sequence
+        if not is_newer(seq, last):
+            self.metrics.count('fast_path_late')
+            return
+        if last is not None and seq > last + 1:
+            self.metrics.count('fast_path_lost', seq - last - 1)
+        self.last_sequence = seq
+
+        sampled = datetime.fromtimestamp(sampled, timezone.utc)
+        updates = {path: Datapoint(convert(value), sampled)
+                   for path, convert, value in zip(self.paths, CONVERTERS, values)}
+        updates[self.sequence_signal] = Datapoint(seq, datetime.fromtimestamp(sent, timezone.utc))
+        self.deliver(updates)
+
+
+class FastPathReceiver(threading.Thread):
+    """Receive fast path datagrams on ``ip``:``port`` and hand them to a ``FastPathInput``."""
+
+    def __init__(self, fast_path_input, ip, port):
+        super().__init__(name='fast-path', daemon=True)
+        self.input = fast_path_input
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((ip, port))
+        self.socket.settimeout(0.2)  # Checks is_running in between
+        self.is_running = True
+
+    def run(self):
+        while self.is_running:
+            try:
+                data = self.socket.recv(2048)
+            except socket.timeout:
+                continue
+            self.input.datagram_received(data)
+        self.socket.close()
+
+    def stop(self):
+        self.is_running = False
@@ -0,0 +1,181 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from kuksa_client.grpc import VSSClient  # Kuksa Library
+from pycarmaker import CarMaker  # CarMaker Library
+from delta_filter import DeltaFilter
+from typed_updates import TypedUpdates
+from scheduler import RateScheduler
+from rigs import metric_name, rig_paths
+from cm_async import AsyncCarMaker
+
+# One simulation quantity published back to KUKSA for the remote driver
+Feedback = namedtuple('Feedback', [
+    'quantity',  # CarMaker quantity to read
+    'vss_path',  # KUKSA signal it is published as, under the 'Vehicle' root
+    'vss_type',  # Data type of vss_path on the broker, a kuksa_client DataType name
+    'scale',  # Published as the quantity * scale
+    'deadband',  # Minimum change before it is published again
+])
+
+INTEGER_TYPES = ('INT8', 'INT16', 'INT32', 'INT64', 'UINT8', 'UINT16', 'UINT32', 'UINT64')
+
+
+def parse_reply(reply):
+    """The numbers of a CarMaker reply, e.g. b'O12.5 3\\r\\n\\r\\n' or 'O12.5 3'."""
+    if isinstance(reply, bytes):
+        reply = reply.decode()
+    reply = reply.strip()
+    if not reply.startswith('O'):
+        raise ValueError(f"CarMaker replied {reply!r}")
+    return [float(value) for value in reply[1:].split()]
+
+
+class FeedbackReader:
+    """Read the feedback quantities of one rig and turn the changes into KUKSA updates.
+
+    All quantities are read with a single APO command, which CarMaker
+    evaluates as ``list [DVARead A] [DVARead B] ...``. Only values that moved
+    past their deadband are published, plus the full set every
+    ``heartbeat_interval`` seconds.
+    """
+
+    def __init__(self, signals, rig, metrics, heartbeat_interval=1.0):
+        self.signals = tuple(signals)
+        self.rig = rig
+        self.metrics = metrics
+        self.command = "list " + " ".join(f"[DVARead {signal.quantity}]" for signal in self.signals) + "\r"
+        self.converters = tuple(bool if signal.vss_type == 'BOOLEAN' else round if signal.vss_type in INTEGER_TYPES
+                                else float for signal in self.signals)
+        self.typed = TypedUpdates(rig_paths(rig, [signal.vss_path for signal in self.signals]),
+                                  tuple(signal.vss_type for signal in self.signals))
+        self.delta_filter = DeltaFilter([signal.deadband for signal in self.signals], heartbeat_interval, 60.0,
+                                        name=f"Feedback{'' if rig.id is None else ' ' + rig.id}")
+        self.published = metric_name(rig, 'feedback_published')
+
+    def updates(self, reply):
+        """The updates to publish for the reply to ``command``."""
+        readings = parse_reply(reply)
+        if len(readings) != len(self.signals):
+            raise ValueError(f"Expected {len(self.signals)} values from CarMaker, got {len(readings)}")
+        values = [convert(reading * signal.scale)
+                  for convert, reading, signal in zip(self.converters, readings, self.signals)]
+        selected = self.delta_filter.select(values)
+        if not selected:
+            return []
+        self.metrics.count(self.published, len(selected))
+        now = datetime.now(timezone.utc)
+        return [self.typed.entry(position, values[position], now) for position in selected]
+
+
+class FeedbackPublisher(threading.Thread):
+    """Publish the feedback quantities of every rig to KUKSA at a fixed rate.
+
+    Reads on a CarMaker connection of its own, so the feedback never waits
+    for, or delays, the control writes. The changes of all rigs go out as
+    one Set call per tick. Run as a thread for the 'threads' runtime, the
+    asyncio runtime awaits ``run_async`` with its KUKSA client instead.
+
+    Failed reads and Set calls are counted in ``feedback_errors`` (per rig
+    for the reads) and the publisher keeps ticking; after a failed Set the
+    next one carries the full state. Each source of errors is logged at
+    most once per ``error_log_interval`` seconds.
+    """
+
+    def __init__(self, signals, rigs, kuksa_ip, kuksa_port, rate_hz, metrics, heartbeat_interval=1.0, ready=(),
+                 set_timeout=1.0, error_log_interval=10.0):
+        super().__init__(name='feedback', daemon=True)
+        self.readers = [FeedbackReader(signals, rig, metrics, heartbeat_interval) for rig in rigs]
+        self.kuksa_ip = kuksa_ip
+        self.kuksa_port = kuksa_port
+        self.metrics = metrics
+        self.scheduler = RateScheduler(rate_hz, 'feedback', metrics, 60.0)
+        self.ready = ready  # Events set once the simulations are running
+        self.set_timeout = set_timeout
+        self.error_log_interval = error_log_interval
+        self.quiet_until = {}  # Source of errors -> time.monotonic() before which its errors are not logged
+        self.unlogged = {}  # Source of errors -> failures since its last log line
+        self.is_running = True
+
+    def run(self):
+        for event in self.ready:
+            event.wait()
+        connections = []
+        for reader in self.readers:
+            cm = CarMaker(reader.rig.carmaker_ip, reader.rig.carmaker_port)
+            cm.connect()
+            connections.append(cm)
+
+        with VSSClient(self.kuksa_ip, self.kuksa_port) as client:
+            self.scheduler.start()
+            while self.is_running:
+                updates = []
+                for reader, cm in zip(self.readers, connections):
+                    try:
+                        updates.extend(reader.updates(cm.send(reader.command)))
+                    except Exception as e:
+                        self.read_failed(reader, e)
+                if updates:
+                    try:
+                        client.set(updates=updates, timeout=self.set_timeout)
+                    except Exception as e:
+                        self.publish_failed(e)
+                self.scheduler.sleep()
+
+    async def run_async(self, client):
+        connections = [AsyncCarMaker(reader.rig.carmaker_ip, reader.rig.carmaker_port) for reader in self.readers]
+        try:
+            for cm in connections:
+                await cm.connect()
+            self.scheduler.start()
+            while self.is_running:
+                # The rigs are read concurrently
+                replies = await asyncio.gather(*(cm.request(reader.command)
+                                                 for reader, cm in zip(self.readers, connections)),
+                                               return_exceptions=True)
+                updates = []
+                for reader, reply in zip(self.readers, replies):
+                    try:
+                        if isinstance(reply, Exception):
+                            raise reply
+                        updates.extend(reader.updates(reply))
+                    except Exception as e:
+                        self.read_failed(reader, e)
+                if updates:
+                    try:
+                        await client.set(updates=updates, timeout=self.set_timeout)
+                    except Exception as e:
+                        self.publish_failed(e)
+                await self.scheduler.sleep_async()
+        finally:
+            for cm in connections:
+                await cm.close()
+
+    def read_failed(self, reader, error):
+        rig = reader.rig
+        self.metrics.count(metric_name(rig, 'feedback_errors'))
+        self.log_error(f"Reading feedback from CarMaker at {rig.carmaker_ip}:{rig.carmaker_port}", error)
+
+    def publish_failed(self, error):
+        self.metrics.count('feedback_errors')
+        for reader in self.readers:
+            reader.delta_filter.resync()  # The broker may have missed the changes
+        self.log_error(f"Publishing feedback to KUKSA at {self.kuksa_ip}:{self.kuksa_port}", error)
+
+    def log_error(self, action, error):
+        # At most one line per error_log_interval and action, a failing rig would log on every tick
+        now = time.monotonic()
+        if now < self.quiet_until.get(action, 0.0):
+            self.unlogged[action] = self.unlogged.get(action, 0) + 1
+            return
+        unlogged = self.unlogged.pop(action, 0)
+        more = f" ({unlogged} more failures not logged)" if unlogged else ""
+        logging.error(f"{action} failed: {error}{more}")
+        self.quiet_until[action] = now + self.error_log_interval
+
+    def stop(self):
+        self.is_running = False
@@ -0,0 +1,116 @@
+import math
+from collections import deque
+
+from signal_map import SIGNALS
+
+
+def signal_limits(signals=SIGNALS):
+    """Range of every axis for clamping: raw -1..1 mapped through the table's scale and offset, None for buttons."""
+    limits = []
+    for signal in signals:
+        if signal.source == 'axis':
+            ends = (signal.offset - signal.scale, signal.offset + signal.scale)
+            limits.append((min(ends), max(ends)))
+        else:
+            limits.append(None)
+    return tuple(limits)
+
+
+def sample_time(updates, default):
+    """Latest sample timestamp of the datapoints in a subscription update, in seconds, ``default`` without any."""
+    return max((datapoint.timestamp.timestamp() for datapoint in updates.values()
+                if datapoint is not None and datapoint.timestamp is not None), default=default)
+
+
+class Interpolator:
+    """Resample the KUKSA snapshots of one rig at the control rate, a fixed delay behind the wheel.
+
+    Every merged update is added as a snapshot of all signals at the time the
+    Minipc sampled it. ``sample`` returns the values at ``delay`` seconds
+    before now on the Minipc's timeline, so a snapshot that arrives up to
+    ``delay`` late is still on time: the uneven spacing of the WAN is hidden
+    and the axes move linearly between samples instead of in steps. Buttons
+    switch at the sample they changed in. Past the latest snapshot the axes
+    are dead-reckoned along their last slope for at most ``max_extrapolation``
+    seconds, then held.
+
+    The Minipc only publishes the signals that moved, so a gap longer than
+    ``max_gap`` means the values held still; the axes then ramp over the last
+    ``max_gap`` seconds before the next snapshot only.
+
+    The Minipc clock is mapped onto this host's by the smallest transit time
+    seen in the last two ``offset_window`` periods, which needs no clock sync
+    and follows slow drift. Not thread-safe, the caller locks.
+    """
+
+    def __init__(self, delay, max_extrapolation=0.1, max_gap=0.2, limits=None, offset_window=10.0):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.max_gap = max_gap
+        self.limits = limits  # Per signal (low, high) to clamp to, None to not clamp the signal
+        self.axes = [position for position, signal in enumerate(SIGNALS) if signal.source == 'axis']
+        self.snapshots = deque()  # (Minipc sample time, values), oldest first
+        self.offset_window = offset_window
+        self.offset = None  # This host's wall clock minus the Minipc's, plus the shortest transit
+        self.window_min = math.inf
+        self.previous_min = math.inf
+        self.window_end = None
+
+    def add(self, sampled, received, values):
+        """Add the values of a snapshot sampled at ``sampled`` (Minipc wall time) and received at ``received``."""
+        self.track_offset(received - sampled, received)
+        snapshots = self.snapshots
+        if snapshots:
+            last_time, last_values = snapshots[-1]
+            if sampled < last_time:
+                return  # Older than what we have, e.g. a resent heartbeat
+            if sampled == last_time:
+                snapshots.pop()
+            elif sampled - last_time > self.max_gap:
+                # The values held still during the gap
+                snapshots.append((sampled - self.max_gap, last_values))
+        snapshots.append((sampled, tuple(values)))
+
+    def track_offset(self, offset, now):
+        # Smallest offset over the current and the previous window
+        if self.window_end is None:
+            self.window_end = now + self.offset_window
+        elif now >= self.window_end:
+            self.previous_min, self.window_min = self.window_min, math.inf
+            self.window_end = now + self.offset_window
+        self.window_min = min(self.window_min, offset)
+        self.offset = min(self.window_min, self.previous_min)
+
+    def sample(self, now):
+        """The values at ``now`` (this host's wall time) minus the delay, None before the first snapshot."""
+        snapshots = self.snapshots
+        if not snapshots:
+            return None
+        playout = now - self.offset - self.delay
+
+        # Drop the snapshots playout has passed, keeping two to extrapolate from
+        while len(snapshots) > 2 and snapshots[1][0] <= playout:
+            snapshots.popleft()
+
+        first_time, first_values = snapshots[0]
+        if len(snapshots) == 1 or playout <= first_time:
+            return first_values
+
+        second_time, second_values = snapshots[1]
+        if playout <= second_time:
+            fraction = (playout - first_time) / (second_time - first_time)
+            values = list(first_values)
+        else:
+            # Dead-reckon past the latest snapshot
+            ahead = min(playout - second_time, self.max_extrapolation)
+            fraction = 1.0 + ahead / (second_time - first_time)
+            values = list(second_values)
+
+        for position in self.axes:
+            start = first_values[position]
+            value = start + (second_values[position] - start) * fraction
+            if self.limits is not None and self.limits[position] is not None:
+                low, high = self.limits[position]
+                value = low if value < low else high if value > high else value
+            values[position] = value
+        return tuple(values)
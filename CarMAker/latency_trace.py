@@ -0,0 +1,52 @@
+import time
+
+# SEQUENCE_SIGNAL carries the sequence number of the joystick sample a publish
+# was built from. Its datapoint timestamp is the time the Minipc published it,
+# the timestamps of the control signals are the times they were sampled.
+from signal_map import SEQUENCE_SIGNAL
+
+
+class LatencyTrace:
+    """Per-hop latencies from the wheel sample to the CarMaker DVA write.
+
+    * ``sample_to_publish``: sample timestamp to publish timestamp, both taken
+      on the Minipc clock.
+    * ``publish_to_receive``: publish timestamp to arrival at this bridge,
+      across the broker and the WAN. Needs the two hosts' clocks in sync (NTP).
+    * ``receive_to_write``: arrival to ``write_values`` returning, on this
+      host's monotonic clock.
+    """
+
+    def __init__(self, metrics, sequence_signal=SEQUENCE_SIGNAL, prefix=''):
+        self.metrics = metrics
+        self.sequence_signal = sequence_signal
+        self.prefix = prefix  # Prepended to the metric names, e.g. per rig
+        self.sample_to_publish = metrics.histogram(prefix + 'sample_to_publish')
+        self.publish_to_receive = metrics.histogram(prefix + 'publish_to_receive')
+        self.receive_to_write = metrics.histogram(prefix + 'receive_to_write')
+        self.last_sequence = None
+
+    def received(self, updates):
+        """Take the trace information out of a subscription update, before it is merged."""
+        return time.time(), time.monotonic(), updates.pop(self.sequence_signal, None), updates
+
+    def written(self, trace):
+        """Record the hops of an update once it has been written to CarMaker."""
+        received, started, sequence, updates = trace
+        self.receive_to_write.record(time.monotonic() - started)
+        self.metrics.count(self.prefix + 'updates_written')
+
+        if sequence is None or sequence.value is None or sequence.timestamp is None:
+            return
+        published = sequence.timestamp.timestamp()
+        self.publish_to_receive.record(received - published)
+
+        sampled = [dp.timestamp.timestamp() for dp in updates.values()
+                   if dp is not None and dp.timestamp is not None]
+        if sampled:
+            self.sample_to_publish.record(published - max(sampled))
+
+        # Gaps in the sequence are samples the Minipc coalesced before publishing
+        if self.last_sequence is not None and sequence.value > self.last_sequence + 1:
+            self.metrics.count(self.prefix + 'samples_coalesced', sequence.value - self.last_sequence - 1)
+        self.last_sequence = sequence.value
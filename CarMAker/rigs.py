@@ -0,0 +1,168 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from kuksa_client.grpc import VSSClient  # Kuksa Library
+from reconnect import Reconnector
+from signal_map import under_root
+
+# One CarMaker instance driven by the bridge. The rig reads the signal table
+# under its own VSS root, e.g. Rig2.Speed instead of Vehicle.Speed for the
+# root 'Rig2'; rigs sharing a root follow the same wheel. A rig id prefixes
+# the rig's metrics, None keeps the plain metric names.
+Rig = namedtuple('Rig', ['id', 'carmaker_ip', 'carmaker_port', 'vss_root'])
+
+
+def rig_paths(rig, paths):
+    """The rig's VSS paths for signal table paths."""
+    return under_root(paths, rig.vss_root)
+
+
+def metric_name(rig, name):
+    return name if rig.id is None else f"{rig.id}.{name}"
+
+
+class RigFanout(threading.Thread):
+    """Serve the ``KuksaReader`` of every rig from one KUKSA subscription.
+
+    Each update is split by path and handed to the readers subscribed to it.
+    With a worker pool, the CarMaker writes of each rig run on the pool
+    instead of the subscription thread, with at most one write per rig at a
+    time. Updates that arrive while a rig is still writing are merged and go
+    out with its next write, so a slow CarMaker only delays its own rig.
+
+    The subscription starts while the simulations boot. Updates are merged
+    from the start but only written once ``go_live`` was called, when every
+    rig is running. When the connection to the broker drops, the same client
+    reconnects and subscribes again as ``reconnect`` (a ``Reconnector``)
+    decides; the first response of the new subscription carries the current
+    value of every signal, so the rigs resync from it.
+
+    Run as a thread for the 'threads' runtime; the asyncio runtime only uses
+    ``handle_updates`` and ``write_all``.
+    """
+
+    def __init__(self, readers, kuksa_ip, kuksa_port, metrics, workers=0, write_on_update=True, startup=None,
+                 reconnect=None):
+        super().__init__()
+        self.readers = readers
+        self.metrics = metrics
+        self.kuksa_ip = kuksa_ip
+        self.kuksa_port = kuksa_port
+        self.write_on_update = write_on_update  # False when a control loop or the CarMakerController threads write
+        self.routes = {}  # KUKSA path -> readers subscribed to it
+        for reader in readers:
+            for path in reader.subscribed:
+                self.routes.setdefault(path, []).append(reader)
+        self.paths = list(self.routes)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='rig-writer') if workers else None
+        self.scheduled = set()  # Readers with a write queued or running on the pool
+        self.lock = threading.Lock()
+        self.startup = startup  # StartupTimer marking the KUKSA phases, if any
+        self.reconnect = reconnect if reconnect is not None else Reconnector('kuksa', metrics)
+        self.live = False  # Whether the simulations run and updates are written
+        self.is_running = True
+        self.client = None
+
+    def run(self):
+        # One client for the whole session, reconnected in place when the connection drops
+        client = self.client = VSSClient(self.kuksa_ip, self.kuksa_port)
+        while self.is_running:
+            try:
+                client.connect()
+                self.reconnect.connected()
+                self.mark('kuksa_connected')
+
+                # The first response of the subscription carries the current value of every signal,
+                # after that the broker only pushes the signals that changed.
+                subscribed = False
+                for updates in client.subscribe_current_values(self.paths):
+                    if not self.is_running:
+                        break
+                    self.handle_updates(updates)
+                    self.reconnect.succeeded()
+                    if not subscribed:
+                        subscribed = True
+                        self.mark('kuksa_subscribed')
+                else:
+                    raise ConnectionError("The broker ended the subscription")
+            except Exception as e:
+                client.disconnect()
+                if not self.is_running:
+                    logging.debug(f"Subscription closed: {e}")
+                    break
+                delay = self.reconnect.failed(e)
+                if delay is None:
+                    break
+                time.sleep(delay)
+        client.disconnect()
+
+    def mark(self, phase):
+        if self.startup is not None:
+            self.startup.mark(phase)
+
+    def go_live(self):
+        """Start writing once every simulation runs, beginning with the values merged so far."""
+        self.live = True
+        if self.write_on_update:
+            self.write_all()
+
+    def handle_updates(self, updates):
+        if len(self.readers) == 1:
+            routed = ((self.readers[0], updates),)
+        else:
+            split = {}
+            for path, datapoint in updates.items():
+                for reader in self.routes.get(path, ()):
+                    split.setdefault(reader, {})[path] = datapoint
+            routed = split.items()
+
+        for reader, rig_updates in routed:
+            if reader.handle_updates(rig_updates) and self.write_on_update and self.live:
+                self.write_soon(reader)
+
+    def sender_restarted(self):
+        """The Minipc restarted and counts its samples from the start again."""
+        for reader in self.readers:
+            reader.sender_restarted()
+
+    def write_all(self):
+        """Write the pending values of every rig, e.g. on a control tick."""
+        if not self.live:
+            return
+        for reader in self.readers:
+            self.write_soon(reader)
+
+    def write_soon(self, reader):
+        if self.executor is None:
+            reader.write_pending()
+            return
+        with self.lock:
+            if reader in self.scheduled:
+                return  # The queued or running write picks up the latest values
+            self.scheduled.add(reader)
+        self.executor.submit(self.drain, reader)
+
+    def drain(self, reader):
+        # Runs on the pool: write until the rig has nothing pending
+        try:
+            while True:
+                reader.write_pending()
+                with self.lock:
+                    if reader.pending is None:
+                        self.scheduled.discard(reader)
+                        return
+        except Exception as e:
+            logging.error(f"Writing to CarMaker at {reader.rig.carmaker_ip}:{reader.rig.carmaker_port} failed: {e}")
+            self.metrics.count(metric_name(reader.rig, 'write_errors'))
+            with self.lock:
+                self.scheduled.discard(reader)
+
+    def stop(self):
+        self.is_running = False
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        if self.client is not None:
+            self.client.disconnect()  # Unblocks the subscription stream
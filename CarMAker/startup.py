@@ -0,0 +1,41 @@
+import time
+import logging
+import threading
+
+LAUNCHED = time.monotonic()  # Imported by the bridge first thing, close enough to the launch
+
+
+class StartupTimer:
+    """Log how long after launch each startup phase completed.
+
+    The first time a phase is marked, its time since launch is logged and
+    kept in ``metrics`` as the gauge ``startup_<phase>`` (seconds), prefixed
+    e.g. per rig. Later marks of the same phase are ignored.
+    """
+
+    def __init__(self, metrics, launched=LAUNCHED):
+        self.metrics = metrics
+        self.launched = launched
+        self.marked = set()
+        self.lock = threading.Lock()  # Phases are marked from several threads
+
+    def mark(self, phase, prefix=''):
+        name = f'{prefix}startup_{phase}'
+        with self.lock:
+            if name in self.marked:
+                return
+            self.marked.add(name)
+        elapsed = time.monotonic() - self.launched
+        self.metrics.gauge(name, elapsed)
+        logging.info(f"Startup: {prefix}{phase} after {elapsed * 1000:.0f} ms")
+
+
+def is_running(reply):
+    """Whether a reply to ``SimStatus`` says the simulation is running (0 or more)."""
+    if isinstance(reply, bytes):
+        reply = reply.decode()
+    reply = reply.strip()
+    try:
+        return reply.startswith('O') and int(float(reply[1:].split()[0])) >= 0
+    except (ValueError, IndexError):
+        return False
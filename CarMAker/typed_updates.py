@@ -0,0 +1,32 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+from kuksa_client.grpc import DataEntry, DataType, Datapoint, EntryUpdate, Field, Metadata
+
+from signal_map import PATHS, SEQUENCE_SIGNAL, SEQUENCE_TYPE, SIGNALS
+
+
+class TypedUpdates:
+    """Build the updates of one publish with the data types from the signal table.
+
+    ``set_current_values`` asks the broker for the type of every path before
+    each publish and then sends every datapoint on its own. Updates that
+    already carry their type go out with ``VSSClient.set`` as a single Set
+    call instead. The per-signal metadata is built once here.
+    """
+
+    FIELDS = (Field.VALUE,)
+
+    def __init__(self, paths=PATHS, types=tuple(signal.vss_type for signal in SIGNALS),
+                 sequence_signal=SEQUENCE_SIGNAL):
+        self.paths = paths
+        self.sequence_signal = sequence_signal
+        self.metadata = tuple(Metadata(data_type=DataType[name]) for name in types)
+        self.sequence_metadata = Metadata(data_type=DataType[SEQUENCE_TYPE])
+
+    def entry(self, position, value, timestamp=None):
+        return EntryUpdate(DataEntry(self.paths[position], value=Datapoint(value, timestamp),
+                                     metadata=self.metadata[position]), self.FIELDS)
+
+    def sequence(self, seq, timestamp):
+        return EntryUpdate(DataEntry(self.sequence_signal, value=Datapoint(seq, timestamp),
+                                     metadata=self.sequence_metadata), self.FIELDS)
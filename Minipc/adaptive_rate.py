@@ -0,0 +1,119 @@
+import time
+import logging
+
+# Weights of a new sample in the smoothed round-trip time and error rate
+RTT_GAIN = 0.125
+ERROR_GAIN = 0.1
+
+
+class AdaptiveRate:
+    """Publish rate that follows what the link to the broker sustains.
+
+    Every Set call is timed with ``record`` (or ``failed`` when it raised).
+    While calls come back within the publish interval and close to the
+    link's baseline round-trip time, the rate grows by ``increase`` Hz per
+    second. As soon as a call takes longer than the interval, the smoothed
+    round-trip time exceeds both ``congestion`` times the baseline and half
+    the interval (growth that is mere jitter on a fast link does not count),
+    or a call fails, the rate is cut by the factor ``decrease``, at most
+    once per round trip so one slow burst does not cut it repeatedly. The
+    rate stays between ``min_hz`` and ``max_hz``; with both equal it is
+    fixed and only the round trips are measured. Each publish carries the latest snapshot,
+    so a lower rate skips intermediate samples rather than queueing them.
+
+    The baseline is the lowest round-trip time of the last two
+    ``baseline_window`` periods, so it follows a link that permanently got
+    slower. Kept in ``metrics``, prefixed with ``name``: the histogram
+    ``<name>_rtt``, the gauges ``<name>_rate_hz``, ``<name>_rtt_smoothed``,
+    ``<name>_rtt_baseline`` (seconds) and ``<name>_error_rate`` and the
+    counter ``<name>_errors``. A summary is logged every ``report_interval``
+    seconds.
+    """
+
+    def __init__(self, min_hz, max_hz, metrics=None, name='publish', increase=2.0, decrease=0.7, congestion=2.0,
+                 baseline_window=30.0, report_interval=10.0):
+        self.min_hz = min_hz
+        self.max_hz = max_hz
+        self.rate = max_hz
+        self.metrics = metrics
+        self.name = name
+        self.increase = increase
+        self.decrease = decrease
+        self.congestion = congestion
+        self.baseline_window = baseline_window
+        self.report_interval = report_interval
+        self.rtt = metrics.histogram(f'{name}_rtt') if metrics is not None else None
+        self.smoothed = None  # Smoothed round-trip time, None before the first call
+        self.window_min = None  # Lowest round-trip time of the current baseline window
+        self.previous_min = None  # ... and of the one before
+        self.error_rate = 0.0
+        self.errors = 0
+        self.last_update = None
+        self.hold_until = 0.0  # No further decrease before, one round trip after the last one
+        now = time.monotonic()
+        self.window_end = now + baseline_window
+        self.next_report = now + report_interval
+
+    @property
+    def interval(self):
+        """Seconds between two publishes at the current rate."""
+        return 1.0 / self.rate
+
+    @property
+    def baseline(self):
+        if self.previous_min is None:
+            return self.window_min
+        return min(self.window_min, self.previous_min)
+
+    def record(self, rtt):
+        """Adapt to a Set call that completed after ``rtt`` seconds."""
+        now = time.monotonic()
+        if self.rtt is not None:
+            self.rtt.record(rtt)
+        self.smoothed = rtt if self.smoothed is None else self.smoothed + RTT_GAIN * (rtt - self.smoothed)
+        if now >= self.window_end:
+            self.previous_min, self.window_min = self.window_min, None
+            self.window_end = now + self.baseline_window
+        if self.window_min is None or rtt < self.window_min:
+            self.window_min = rtt
+        self.error_rate -= ERROR_GAIN * self.error_rate
+
+        interval = self.interval
+        if rtt > interval or self.smoothed > max(self.congestion * self.baseline, interval / 2):
+            self.slow_down(now)
+        elif self.last_update is not None:
+            self.rate = min(self.max_hz, self.rate + self.increase * (now - self.last_update))
+        self.updated(now)
+
+    def failed(self):
+        """Adapt to a Set call that raised or timed out."""
+        now = time.monotonic()
+        self.errors += 1
+        self.error_rate += ERROR_GAIN * (1.0 - self.error_rate)
+        if self.metrics is not None:
+            self.metrics.count(f'{self.name}_errors')
+        self.slow_down(now)
+        self.updated(now)
+
+    def slow_down(self, now):
+        if now < self.hold_until:
+            return
+        self.rate = max(self.min_hz, self.rate * self.decrease)
+        self.hold_until = now + (self.smoothed or 0.0)
+
+    def updated(self, now):
+        self.last_update = now
+        if self.metrics is not None:
+            self.metrics.gauge(f'{self.name}_rate_hz', self.rate)
+            self.metrics.gauge(f'{self.name}_error_rate', self.error_rate)
+            if self.smoothed is not None:
+                self.metrics.gauge(f'{self.name}_rtt_smoothed', self.smoothed)
+                self.metrics.gauge(f'{self.name}_rtt_baseline', self.baseline)
+        if now >= self.next_report:
+            self.report()
+            self.next_report = now + self.report_interval
+
+    def report(self):
+        rtt = f"{self.smoothed * 1000:.1f}ms (baseline {self.baseline * 1000:.1f}ms)" if self.smoothed else "n/a"
+        logging.info(f"{self.name} rate {self.rate:.1f} Hz ({self.min_hz:g}-{self.max_hz:g}), round trip {rtt}, "
+                     f"{self.errors} errors, error rate {self.error_rate:.0%}")
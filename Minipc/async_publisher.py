@@ -0,0 +1,72 @@
+import time
+import asyncio
+import logging
+
+from kuksa_client.grpc.aio import VSSClient as AsyncVSSClient
+
+
+async def run_publisher(joystick_reader, sender, ip, port, set_timeout=None):
+    """Publish joystick snapshots to KUKSA from a single event loop.
+
+    Instead of waking up every 100 ms, the publisher sleeps until the joystick
+    thread reports a new snapshot or the next heartbeat of the sender's delta
+    filter is due. The interval of the sender's ``rate`` bounds the publish
+    rate towards the broker, and every Set call is timed for it. ``sender``
+    is a ``ConnectToKuksa`` whose thread is never started; only its
+    ``next_updates``, ``publish_failed`` and ``connected`` methods and its
+    ``rate`` and ``connection`` are used. Set calls are abandoned after
+    ``set_timeout`` seconds. When the connection drops, the same client
+    reconnects as the sender's ``connection`` decides.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_change():
+        # Runs on the joystick thread; one wakeup is enough for a burst of changes
+        if not changed.is_set():
+            loop.call_soon_threadsafe(changed.set)
+
+    joystick_reader.listeners.append(on_change)
+    client = AsyncVSSClient(ip, port)
+    try:
+        while sender.isRunning and joystick_reader.isRunning:
+            try:
+                await client.connect()
+                sender.connected()
+                logging.info(f"Connected to KUKSA Data Broker at {ip}:{port}")
+                while sender.isRunning and joystick_reader.isRunning:
+                    changed.clear()
+                    started = time.monotonic()
+                    initial = sender.first_run
+                    updates = sender.next_updates(joystick_reader.state)
+                    if updates:
+                        try:
+                            await client.set(updates=updates, timeout=set_timeout)
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception:
+                            sender.publish_failed(started)
+                        else:
+                            sender.rate.record(time.monotonic() - started)
+                            sender.connection.succeeded()
+                    if initial:
+                        continue  # Follow the initial zeros with the current state right away
+
+                    # Rate limit, then wait for the next change or heartbeat
+                    await asyncio.sleep(max(0.0, sender.rate.interval - (time.monotonic() - started)))
+                    timeout = max(0.0, sender.delta_filter.next_heartbeat - time.monotonic())
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await client.disconnect()
+                delay = sender.connection.failed(e)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+    finally:
+        joystick_reader.listeners.remove(on_change)
+        await client.disconnect()
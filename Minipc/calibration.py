@@ -0,0 +1,160 @@
+"""Calibration of the G29 axes as precomputed lookup tables.
+
+pygame reports an axis as a signed 16-bit reading divided by 32767, so every
+axis is normalized with one table of 65536 entries built up front with NumPy:
+the sampler only indexes it, whatever the calibration and response curve.
+
+A calibration file is JSON with an entry per signal name of signal_map.SIGNALS,
+every key optional::
+
+    {
+        "steering": {"raw_min": -0.98, "raw_center": 0.01, "raw_max": 0.99, "dead_zone": 0.01},
+        "gas": {"raw_min": -1.0, "raw_max": 0.97, "dead_zone": 0.03, "curve": 1.6},
+        "brake": {"curve": [[0, 0], [0.5, 0.2], [1, 1]]}
+    }
+
+* ``raw_min``/``raw_max``: the readings at the ends of the axis' travel,
+  ``raw_center`` the one at rest for a centered axis such as the wheel
+* ``dead_zone``: fraction of the travel at rest that still reads as rest
+* ``curve``: response over the travel, an exponent or ``[travel, output]``
+  points between 0 and 1, interpolated linearly
+
+Without an entry the table reproduces the linear map of the signal table.
+Run ``python calibration.py <file>`` to measure the raw values of a device.
+"""
+import sys
+import json
+import time
+import logging
+from array import array
+
+import numpy as np
+
+from signal_map import NAMES, SIGNALS, compile_inputs
+
+RAW_STEPS = 32767  # Reading per unit of the pygame axis value
+ZERO_INDEX = 32768  # Table index of the reading 0, the table covers -32768..32767
+TABLE_SIZE = 65536
+
+
+def load_calibration(path):
+    with open(path) as file:
+        calibration = json.load(file)
+    unknown = set(calibration) - set(NAMES)
+    if unknown:
+        raise ValueError(f"{path} calibrates unknown signals: {', '.join(sorted(unknown))}")
+    return calibration
+
+
+def shape(travel, entry):
+    """Apply the dead zone and response curve of ``entry`` to a travel from 0 to 1."""
+    dead_zone = entry.get('dead_zone', 0.0)
+    if dead_zone:
+        travel = np.clip((travel - dead_zone) / (1.0 - dead_zone), 0.0, 1.0)
+    curve = entry.get('curve', 1.0)
+    if isinstance(curve, list):
+        points = np.array(curve, dtype=float)
+        return np.interp(travel, points[:, 0], points[:, 1])
+    return travel ** curve if curve != 1.0 else travel
+
+
+def axis_table(signal, entry=None, decimals=3):
+    """The published value of ``signal`` for every raw reading, as a NumPy array indexed by reading + ZERO_INDEX."""
+    entry = entry or {}
+    raw = np.clip((np.arange(TABLE_SIZE) - ZERO_INDEX) / RAW_STEPS, -1.0, 1.0)
+    raw_min = entry.get('raw_min', -1.0)
+    raw_max = entry.get('raw_max', 1.0)
+
+    # The device's travel as -1..1
+    if 'raw_center' in entry:
+        center = entry['raw_center']
+        position = np.where(raw >= center, (raw - center) / (raw_max - center), (raw - center) / (center - raw_min))
+    else:
+        position = 2.0 * (raw - raw_min) / (raw_max - raw_min) - 1.0
+    linear = np.clip(position, -1.0, 1.0) * signal.scale + signal.offset
+
+    # Dead zone and curve act on the travel away from rest: the low end of a pedal, the middle of a centered axis
+    low, high = sorted((signal.offset - signal.scale, signal.offset + signal.scale))
+    if 'raw_center' in entry or low == -high:
+        middle, half = (low + high) / 2.0, (high - low) / 2.0
+        travel = (linear - middle) / half
+        values = middle + np.sign(travel) * shape(np.abs(travel), entry) * half
+    else:
+        values = low + shape((linear - low) / (high - low), entry) * (high - low)
+    return np.round(values, decimals)
+
+
+def table_converter(table):
+    """Converter from a raw pygame axis value to its entry in ``table``."""
+    values = array('d', table.astype(np.float64).tobytes())  # Indexing yields Python floats
+    offset = ZERO_INDEX + 0.5  # Rounds to the nearest reading
+    return lambda raw: values[int(raw * RAW_STEPS + offset)]
+
+
+def compile_calibrated_inputs(signals=SIGNALS, decimals=3, calibration=None):
+    """Like ``signal_map.compile_inputs``, with the axes normalized by lookup tables."""
+    axes, buttons, presses = compile_inputs(signals, decimals)
+    calibration = calibration or {}
+    for axis, (position, _) in axes.items():
+        signal = signals[position]
+        axes[axis] = (position, table_converter(axis_table(signal, calibration.get(signal.name), decimals)))
+    return axes, buttons, presses
+
+
+def calibrate(path, seconds=10.0, rest_seconds=3.0):
+    """Measure the axes of the first joystick and merge them into the calibration file at ``path``."""
+    import pygame
+
+    pygame.init()
+    pygame.joystick.init()
+    joystick = pygame.joystick.Joystick(0)
+    joystick.init()
+    axes = {signal.index: signal for signal in SIGNALS if signal.source == 'axis'}
+
+    def sample(duration):
+        readings = {axis: [] for axis in axes}
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            pygame.event.pump()
+            for axis in axes:
+                readings[axis].append(joystick.get_axis(axis))
+            time.sleep(0.005)
+        return {axis: np.array(values) for axis, values in readings.items()}
+
+    print(f"Turn the wheel to both ends and press every pedal fully, {seconds:g} seconds...")
+    travel = sample(seconds)
+    print(f"Center the wheel and release the pedals, {rest_seconds:g} seconds...")
+    rest = sample(rest_seconds)
+
+    try:
+        with open(path) as file:
+            calibration = json.load(file)
+    except FileNotFoundError:
+        calibration = {}
+    for axis, signal in axes.items():
+        entry = calibration.setdefault(signal.name, {})
+        raw_min, raw_max = float(travel[axis].min()), float(travel[axis].max())
+        if raw_max - raw_min < 0.5:
+            logging.warning(f"{signal.name} barely moved, keeping its calibration")
+            continue
+        entry['raw_min'], entry['raw_max'] = round(raw_min, 4), round(raw_max, 4)
+        # The noise at rest, as a fraction of the travel from rest to one end
+        noise = float(rest[axis].max() - rest[axis].min())
+        low, high = sorted((signal.offset - signal.scale, signal.offset + signal.scale))
+        if low == -high:
+            entry['raw_center'] = round(float(np.median(rest[axis])), 4)
+            entry['dead_zone'] = round(2.0 * noise / (raw_max - raw_min), 4)
+        else:
+            entry['dead_zone'] = round(noise / (raw_max - raw_min), 4)
+
+    with open(path, 'w') as file:
+        json.dump(calibration, file, indent=4)
+    pygame.quit()
+    print(f"Calibration written to {path}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python calibration.py <calibration file>")
+    calibrate(sys.argv[1])
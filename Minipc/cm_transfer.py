@@ -1,39 +1,116 @@
 import time
+import asyncio
 import threading
 import pygame
 import logging
+from datetime import datetime, timezone
 from kuksa_client.grpc import VSSClient
-from kuksa_client.grpc import Datapoint
+from delta_filter import DeltaFilter
+from joystick_state import INITIAL_STATE, JoystickState
+from signal_map import LOG_FORMAT, NAMES, PATHS, PRESS_COUNT_MODULO, SEQUENCE_SIGNAL, SIGNALS, under_root
+from calibration import compile_calibrated_inputs, load_calibration
+from typed_updates import TypedUpdates
+from metrics import Metrics
+from scheduler import RateScheduler
+from adaptive_rate import AdaptiveRate
+from reconnect import Reconnector
+from log_queue import TickLogger, setup_logging
+from recording import Recorder
+from replay_joystick import ReplayJoystick
+from process_joystick import ProcessJoystick
+from fast_path import FastPathSender
+import async_publisher
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# KUKSA data broker IP and port
+KUKSA_DATA_BROKER_IP = '20.79.188.178'
+KUKSA_DATA_BROKER_PORT = 55555
+
+# VSS root the signals are published under, e.g. 'Rig2' to drive the CarMaker bridge's rig with that root
+# from a second wheel. Roots other than 'Vehicle' must be declared on the broker with a VSS overlay.
+VSS_ROOT = 'Vehicle'
+
+# Metrics served as JSON on http://127.0.0.1:METRICS_PORT/metrics (None disables) and logged periodically
+METRICS_PORT = 9100
+METRICS_LOG_INTERVAL = 60.0
+
+# 'asyncio' publishes from one event loop as soon as the joystick state changes,
+# 'threads' runs ConnectToKuksa as a thread that publishes at a fixed rate
+RUNTIME = 'asyncio'
+PUBLISH_RATE_HZ = 10  # Tick rate of the 'threads' runtime, upper bound on publishes in 'asyncio'
+
+# Adapt the publish rate to the broker link between PUBLISH_RATE_MIN_HZ and PUBLISH_RATE_MAX_HZ instead,
+# lowering it when the Set round-trip time grows or calls fail. The round trips are measured either way.
+ADAPTIVE_RATE = False
+PUBLISH_RATE_MIN_HZ = 2
+PUBLISH_RATE_MAX_HZ = 50
+# Seconds after which a Set call is abandoned, the next publish then carries the full current state
+PUBLISH_TIMEOUT = 1.0
+
+# Reconnecting after the broker connection dropped: the first attempt is immediate, then with jittered
+# exponential backoff from RECONNECT_BASE_DELAY up to RECONNECT_MAX_DELAY seconds. Gives up after
+# RECONNECT_MAX_FAILURES failures without a successful publish in between, None retries forever.
+RECONNECT_BASE_DELAY = 0.05
+RECONNECT_MAX_DELAY = 5.0
+RECONNECT_MAX_FAILURES = None
+
+# Joystick sampling: 'event' reacts to pygame joystick events as they arrive,
+# 'poll' reads every axis and button at POLL_RATE_HZ
+SAMPLING_MODE = 'event'
+POLL_RATE_HZ = 500
+
+# Sample the joystick in a process of its own, which hands the samples over through a shared memory ring
+# of SAMPLE_RING_SLOTS samples, so gRPC and logging in this process cannot delay the sampling
+SAMPLER_PROCESS = False
+SAMPLE_RING_SLOTS = 1024
+
+# Calibration of the axes: raw range, dead zones and response curves, written by `python calibration.py <file>`.
+# None keeps the linear map of signal_map.SIGNALS. Either way the axes are normalized by lookup tables.
+CALIBRATION_PATH = None
+
+# Publish only the signals that moved past their deadband, plus a periodic full-state heartbeat.
+# The axis/button to KUKSA mapping, scaling and deadbands are configured in signal_map.SIGNALS.
+DELTA_PUBLISHING = True
+HEARTBEAT_INTERVAL = 1.0  # Seconds between full-state heartbeats
+
+# Per-publish "Sent to KUKSA" log line: 'summary' (one line per TICK_LOG_INTERVAL seconds),
+# 'debug' (every publish, at DEBUG level), 'every' (every publish at INFO) or 'off'
+TICK_LOGGING = 'summary'
+TICK_LOG_INTERVAL = 1.0
+
+# Record every joystick sample to this binary file (None disables), e.g. 'drive.g29rec'
+RECORD_PATH = None
+# Publish a recording instead of reading the G29, REPLAY_SPEED times faster than recorded (0 as fast as possible)
+REPLAY_PATH = None
+REPLAY_SPEED = 1.0
+
+# Also send every joystick sample straight to the CarMaker bridge as a UDP datagram when both are on one LAN,
+# as (CarMaker host IP, FAST_PATH_PORT there); None disables. KUKSA publishing continues for other consumers.
+FAST_PATH_TARGET = None
+
+# Initialize logging, the console is written from a background thread
+setup_logging(logging.INFO, '%(asctime)s - %(levelname)s - %(message)s')
+
+# Counters and latency histograms of this publisher
+metrics = Metrics()
 
 # Joystick Reader Thread Class
 class JoystickReader(threading.Thread):
-    def __init__(self):
+    def __init__(self, samplingMode=SAMPLING_MODE, pollRate=POLL_RATE_HZ, calibrationPath=CALIBRATION_PATH):
         super().__init__()
-        # Initialize all values to 0
-        self.steering = 0.0
-        self.gas = 0.0
-        self.brake = 0.0
-        self.clutch = 0.0
-        self.handbrake = 0
-        self.reverse = 0
-        self.enter = 0
-        self.exit = 0
+        # Initialize all values to 0, replaced by a new snapshot on every change
+        self.state = INITIAL_STATE
         self.user_input = 0.0  # Variable for new axis 6 input
         self.isRunning = True
-        self.lock = threading.Lock()  # To make joystick data access thread-safe
         self.precisionDecimals = 3
-        self.sleepTime = 0.1  # Shortened sleep time for more frequent updates
-
-    def pedalValuesNormalize(self, val):
-        # Normalize pedal values to a range of 0 to 1
-        return round((1 - val) / 2, self.precisionDecimals)
-
-    def steeringValuesNormalize(self, val):
-        # Normalize steering values (scaling factor adjusted for demonstration)
-        return round(val * 9, self.precisionDecimals)
+        # Axis number -> (position in the state, normalizing lookup), button number -> position,
+        # button number -> position of its press count
+        calibration = load_calibration(calibrationPath) if calibrationPath else None
+        self.axes, self.buttons, self.presses = compile_calibrated_inputs(SIGNALS, self.precisionDecimals, calibration)
+        self.samplingMode = samplingMode
+        self.pollRate = pollRate  # Samples per second in polling mode
+        self.eventTimeout = 100  # Milliseconds to wait for an event before checking isRunning
+        self.listeners = []  # Called from the joystick thread after every new snapshot
+        self.reportInterval = 10.0  # Seconds between sampling jitter reports
 
     def run(self):
         pygame.init()
@@ -49,32 +126,93 @@ class JoystickReader(threading.Thread):
             self.isRunning = False
             return
 
+        # Start from the current position, events only report changes
+        changes = {}
+        self.readAll(joystick, changes)
+        self.publish(changes, time.monotonic())
+
+        if self.samplingMode == 'event':
+            self.readEvents()
+        else:
+            self.readPolling(joystick)
+
+    def readEvents(self):
+        """Update the state from pygame joystick events as they arrive."""
         while self.isRunning:
-            with self.lock:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        self.isRunning = False
-
-                # Read joystick axis values
-                _steering = joystick.get_axis(0)  # Axis 0 for steering wheel
-                _brake = joystick.get_axis(3)     # Axis 3 for brake
-                _clutch = joystick.get_axis(1)    # Axis 1 for clutch
-                _gas = joystick.get_axis(2)       # Axis 2 for throttle/gas
-                
-                # Update joystick values
-                self.steering = self.steeringValuesNormalize(_steering * -1)
-                self.brake = self.pedalValuesNormalize(_brake)
-                self.clutch = self.pedalValuesNormalize(_clutch)
-                self.gas = self.pedalValuesNormalize(_gas)
-                  # Normalizing axis 6 value
-
-                # Button values
-                self.handbrake = 1 if joystick.get_button(4) else 0
-                self.reverse = 1 if joystick.get_button(5) else 0
-                self.enter = 1 if joystick.get_button(6) else 0
-                self.exit = 1 if joystick.get_button(7) else 0
-
-            time.sleep(self.sleepTime)
+            event = pygame.event.wait(self.eventTimeout)
+            if event.type == pygame.NOEVENT:
+                continue
+            now = time.monotonic()
+            changes = {}
+            self.handleEvent(event, changes)
+            # Apply everything else that queued up in the meantime as one snapshot
+            for event in pygame.event.get():
+                self.handleEvent(event, changes)
+            self.publish(changes, now)
+
+    def readPolling(self, joystick):
+        """Read every axis and button at a fixed rate."""
+        # Samples at absolute times so the rate does not drift, and reports the jitter
+        scheduler = RateScheduler(self.pollRate, 'sampling', metrics, self.reportInterval)
+        scheduler.start()
+        while self.isRunning:
+            now = time.monotonic()
+            pygame.event.pump()
+            changes = {}
+            self.readAll(joystick, changes)
+            self.publish(changes, now)
+            scheduler.sleep()
+
+    def handleEvent(self, event, changes):
+        if event.type == pygame.QUIT:
+            self.isRunning = False
+        elif event.type == pygame.JOYAXISMOTION:
+            self.setAxis(changes, event.axis, event.value)
+        elif event.type == pygame.JOYBUTTONDOWN:
+            self.setButton(changes, event.button, 1)
+        elif event.type == pygame.JOYBUTTONUP:
+            self.setButton(changes, event.button, 0)
+
+    def readAll(self, joystick, changes):
+        for axis in self.axes:
+            self.setAxis(changes, axis, joystick.get_axis(axis))
+        for button in self.buttons:
+            self.setButton(changes, button, 1 if joystick.get_button(button) else 0)
+
+    def setAxis(self, changes, axis, raw):
+        mapped = self.axes.get(axis)
+        if mapped is not None:
+            position, convert = mapped
+            self.update(changes, position, convert(raw))
+
+    def setButton(self, changes, button, pressed):
+        position = self.buttons.get(button)
+        if position is None:
+            return
+        counter = self.presses.get(button)
+        if counter is not None and pressed and not changes.get(position, self.state[position]):
+            # Count the press edge, so a press and release between two publishes is not lost
+            count = changes.get(counter, self.state[counter])
+            changes[counter] = (count + 1) % PRESS_COUNT_MODULO
+        self.update(changes, position, pressed)
+
+    def update(self, changes, position, value):
+        if self.state[position] != value:
+            changes[position] = value
+        else:
+            changes.pop(position, None)  # Changed back within the same snapshot
+
+    def publish(self, changes, now):
+        # Stamp the new snapshot with the time it was sampled at and a sequence number.
+        # Swapping the reference is atomic, so the sender can read it without a lock.
+        if changes:
+            values = list(self.state)
+            for position, value in changes.items():
+                values[position] = value
+            values[-3:] = now, time.time(), self.state.seq + 1  # timestamp, time, seq
+            self.state = JoystickState._make(values)
+            for listener in self.listeners:
+                listener()
 
     def stop(self):
         self.isRunning = False
@@ -85,75 +223,139 @@ class ConnectToKuksa(threading.Thread):
         super().__init__()
         self.joystick_reader = joystick_reader
         self.isRunning = True
-        self.retries = 0
-        self.max_retries = 5  # Max retry attempts to reconnect
+        self.connection = Reconnector('kuksa', metrics, RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY,
+                                      RECONNECT_MAX_FAILURES)
         self.first_run = True  # Flag to send initial zero values
+        self.seen_seq = None  # Sequence number of the snapshot the previous publish tick saw
+        self.delta_filter = DeltaFilter([signal.deadband for signal in SIGNALS], HEARTBEAT_INTERVAL,
+                                        enabled=DELTA_PUBLISHING)
+        self.typed_updates = TypedUpdates(under_root(PATHS, VSS_ROOT),
+                                          sequence_signal=under_root([SEQUENCE_SIGNAL], VSS_ROOT)[0])
+        self.sample_to_publish = metrics.histogram('sample_to_publish')
+        self.tick_log = TickLogger("Sent to KUKSA - " + LOG_FORMAT + " (%d changed)", TICK_LOGGING, TICK_LOG_INTERVAL)
+        if ADAPTIVE_RATE:
+            self.rate = AdaptiveRate(PUBLISH_RATE_MIN_HZ, PUBLISH_RATE_MAX_HZ, metrics)
+        else:
+            self.rate = AdaptiveRate(PUBLISH_RATE_HZ, PUBLISH_RATE_HZ, metrics)
+        self.scheduler = RateScheduler(self.rate.rate, 'publish', metrics)  # Paces the 'threads' runtime
 
     def run(self):
-        kuksaDataBroker_IP = '20.79.188.178'
-        kuksaDataBroker_Port = 55555
+        kuksaDataBroker_IP = KUKSA_DATA_BROKER_IP
+        kuksaDataBroker_Port = KUKSA_DATA_BROKER_PORT
 
-        while self.retries < self.max_retries:
+        # One client for the whole session, reconnected in place when the connection drops
+        client = VSSClient(kuksaDataBroker_IP, kuksaDataBroker_Port)
+        while self.isRunning and self.joystick_reader.isRunning:
             try:
-                with VSSClient(kuksaDataBroker_IP, kuksaDataBroker_Port) as client:
-                    logging.info(f"Connected to KUKSA Data Broker at {kuksaDataBroker_IP}:{kuksaDataBroker_Port}")
-
-                    while self.isRunning and self.joystick_reader.isRunning:
-                        with self.joystick_reader.lock:
-                            if self.first_run:
-                                # Send initial zero values to KUKSA
-                                client.set_current_values({
-                                    'Vehicle.OBD.RelativeThrottlePosition': Datapoint(0.0),
-                                    'Vehicle.Powertrain.Transmission.ClutchEngagement': Datapoint(0.0),
-                                    'Vehicle.ADAS.CruiseControl.SpeedSet': Datapoint(0.0),
-                                    'Vehicle.Speed': Datapoint(0.0),
-                                    'Vehicle.Chassis.Axle.Row1.Wheel.Right.Brake.PadWear': Datapoint(False),
-                                    'Vehicle.Chassis.Axle.Row2.Wheel.Left.Brake.PadWear': Datapoint(False),
-                                    'Vehicle.ADAS.CruiseControl.IsActive': Datapoint(False),
-                                    'Vehicle.ADAS.CruiseControl.IsEnabled': Datapoint(False),
-                                    
-                                })
-                                logging.info("Sent initial values: All zeros")
-                                self.first_run = False
-                            else:
-                                # Send joystick values to KUKSA Data Broker
-                                client.set_current_values({
-                                    'Vehicle.OBD.RelativeThrottlePosition': Datapoint(float(self.joystick_reader.gas)),
-                                    'Vehicle.Powertrain.Transmission.ClutchEngagement': Datapoint(float(self.joystick_reader.clutch)),
-                                    'Vehicle.ADAS.CruiseControl.SpeedSet': Datapoint(float(self.joystick_reader.brake)),
-                                    'Vehicle.Speed': Datapoint(float(self.joystick_reader.steering)),
-                                    'Vehicle.Chassis.Axle.Row1.Wheel.Right.Brake.PadWear': Datapoint(bool(self.joystick_reader.handbrake)),
-                                    'Vehicle.Chassis.Axle.Row2.Wheel.Left.Brake.PadWear': Datapoint(bool(self.joystick_reader.reverse)),
-                                    'Vehicle.ADAS.CruiseControl.IsActive': Datapoint(bool(self.joystick_reader.enter)),
-                                    'Vehicle.ADAS.CruiseControl.IsEnabled': Datapoint(bool(self.joystick_reader.exit)),
-                                   
-                                })
-
-                                # Logging data for debugging
-                                logging.info(f"Sent to KUKSA - Gas: {self.joystick_reader.gas}, "
-                                             f"Clutch: {self.joystick_reader.clutch}, Brake: {self.joystick_reader.brake}, "
-                                             f"Steering: {self.joystick_reader.steering}, Handbrake: {self.joystick_reader.handbrake}, "
-                                             f"Reverse: {self.joystick_reader.reverse}, Enter: {self.joystick_reader.enter}, "
-                                             f"Exit: {self.joystick_reader.exit}")
-                        time.sleep(0.1)
+                client.connect()
+                self.connected()
+                logging.info(f"Connected to KUKSA Data Broker at {kuksaDataBroker_IP}:{kuksaDataBroker_Port}")
+
+                self.scheduler.start()
+                while self.isRunning and self.joystick_reader.isRunning:
+                    # Latest snapshot, taking it never blocks the joystick thread
+                    updates = self.next_updates(self.joystick_reader.state)
+                    if updates:
+                        started = time.monotonic()
+                        try:
+                            client.set(updates=updates, timeout=PUBLISH_TIMEOUT)
+                        except Exception:
+                            self.publish_failed(started)
+                        else:
+                            self.rate.record(time.monotonic() - started)
+                            self.connection.succeeded()
+                    self.scheduler.set_rate(self.rate.rate)
+                    self.scheduler.sleep()
 
             except Exception as e:
-                logging.error(f"Connection error: {e}. Retrying ({self.retries}/{self.max_retries})...")
-                self.retries += 1
-                time.sleep(2)  # Wait before retrying the connection
+                client.disconnect()
+                delay = self.connection.failed(e)
+                if delay is None:
+                    self.isRunning = False  # Gave up, ends run_threads
+                    break
+                time.sleep(delay)
+        client.disconnect()
 
-        if self.retries >= self.max_retries:
-            logging.critical("Max retries reached. Failed to reconnect to KUKSA Data Broker.")
+    def connected(self):
+        """Start over on a new connection: the next publish carries the full current state, not a backlog."""
+        self.connection.connected()
+        self.delta_filter.resync()
+
+    def next_updates(self, state):
+        """Typed updates to publish for a joystick snapshot, empty if nothing needs to be sent."""
+        if self.first_run:
+            # Send initial zero values to KUKSA
+            self.first_run = False
+            self.delta_filter.reset(INITIAL_STATE[:len(SIGNALS)])
+            logging.info("Sending initial values: All zeros")
+            # Stamped like the samples, the bridge ages every update by its timestamps
+            now = datetime.now(timezone.utc)
+            return [self.typed_updates.entry(position, value, now)
+                    for position, value in enumerate(INITIAL_STATE[:len(SIGNALS)])]
+
+        # The signals are the first fields of the snapshot, in signal table order
+        values = state[:len(SIGNALS)]
+
+        # Send only the joystick values that moved past their deadband
+        selected = self.delta_filter.select(values)
+        new_sample = state.seq != self.seen_seq
+        self.seen_seq = state.seq
+
+        # Logging data for debugging
+        self.tick_log.log(*values, len(selected))
+        if not selected:
+            return []
+
+        # Carry the sample time on every datapoint and the sequence number with the publish time. A snapshot
+        # seen on an earlier tick (sent by a heartbeat or resync while the wheel rests) is still current: it
+        # carries the publish time, so the bridge does not age it from the last movement.
+        now = datetime.now(timezone.utc)
+        sampled = datetime.fromtimestamp(state.time, timezone.utc) if new_sample else now
+        entry = self.typed_updates.entry
+        updates = [entry(position, values[position], sampled) for position in selected]
+        updates.append(self.typed_updates.sequence(state.seq, now))
+        if new_sample:
+            self.sample_to_publish.record(time.monotonic() - state.timestamp)
+        return updates
+
+    def publish_failed(self, started):
+        """Account for a Set call that raised. Timeouts are dropped, other errors are raised again."""
+        self.rate.failed()
+        self.delta_filter.resync()  # The broker may have missed the changes of that publish
+        if time.monotonic() - started < PUBLISH_TIMEOUT:
+            raise
+        logging.debug(f"Publish timed out after {PUBLISH_TIMEOUT:g}s, sending the current state next")
 
     def stop(self):
         self.isRunning = False
 
-# Main logic to run the threads
-if __name__ == '__main__':
-    joystick_reader = JoystickReader()
-    kuksa_client = ConnectToKuksa(joystick_reader)
+def record_to(joystick_reader, path):
+    """Append every new joystick snapshot to a binary recording, from the joystick thread."""
+    recorder = Recorder(path, NAMES)
+    count = len(NAMES)
 
-    joystick_reader.start()
+    def record():
+        state = joystick_reader.state
+        recorder.write(state.timestamp, state.seq, state[:count])
+
+    joystick_reader.listeners.append(record)
+    logging.info(f"Recording joystick samples to {path}")
+    return recorder
+
+def fast_path_to(joystick_reader, host, port):
+    """Send every new joystick snapshot to the CarMaker bridge over UDP, from the joystick thread."""
+    sender = FastPathSender(host, port, metrics)
+    count = len(NAMES)
+
+    def send():
+        state = joystick_reader.state
+        sender.send(state.seq, state.time, state[:count])
+
+    joystick_reader.listeners.append(send)
+    logging.info(f"Sending joystick samples to {host}:{port} over the UDP fast path")
+    return sender
+
+def run_threads(joystick_reader, kuksa_client):
     kuksa_client.start()
 
     try:
@@ -166,3 +368,45 @@ if __name__ == '__main__':
         kuksa_client.stop()
         kuksa_client.join()
         print("Threads have been stopped.")
+
+def run_asyncio(joystick_reader, kuksa_client):
+    try:
+        asyncio.run(async_publisher.run_publisher(
+            joystick_reader, kuksa_client, KUKSA_DATA_BROKER_IP, KUKSA_DATA_BROKER_PORT, PUBLISH_TIMEOUT,
+        ))
+    except KeyboardInterrupt:
+        print("\nKeyboardInterrupt caught. Stopping...")
+    finally:
+        joystick_reader.stop()
+        joystick_reader.join()
+        print("Publisher has been stopped.")
+
+# Main logic to run the threads
+if __name__ == '__main__':
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    metrics.log_every(METRICS_LOG_INTERVAL)
+
+    if REPLAY_PATH:
+        joystick_reader = ReplayJoystick(REPLAY_PATH, REPLAY_SPEED)
+    elif SAMPLER_PROCESS:
+        joystick_reader = ProcessJoystick(JoystickReader, SAMPLE_RING_SLOTS, metrics)
+    else:
+        joystick_reader = JoystickReader()
+    kuksa_client = ConnectToKuksa(joystick_reader)
+    recorder = record_to(joystick_reader, RECORD_PATH) if RECORD_PATH else None
+    fast_path = fast_path_to(joystick_reader, *FAST_PATH_TARGET) if FAST_PATH_TARGET else None
+
+    # The joystick is always sampled on its own thread or process, pygame has no awaitable event source
+    joystick_reader.start()
+
+    if RUNTIME == 'asyncio':
+        run_asyncio(joystick_reader, kuksa_client)
+    else:
+        run_threads(joystick_reader, kuksa_client)
+
+    if fast_path is not None:
+        fast_path.close()
+    if recorder is not None:
+        recorder.close()
+        logging.info(f"Recorded {recorder.count} samples to {RECORD_PATH}")
@@ -0,0 +1,16 @@
+from collections import namedtuple
+
+from signal_map import NAMES, SIGNALS
+
+# Immutable snapshot of the wheel, pedals and buttons. JoystickReader replaces
+# its `state` attribute with a new snapshot on every change; swapping the
+# reference is atomic, so readers never need a lock and never see a half
+# updated state. The first fields are the signals of the signal table, in
+# table order, so they can be read by position.
+JoystickState = namedtuple('JoystickState', NAMES + (
+    'timestamp',  # time.monotonic() of the last change
+    'time',  # time.time() of the last change, the source timestamp sent along to KUKSA
+    'seq',  # Sequence number, incremented for every snapshot
+))
+
+INITIAL_STATE = JoystickState(*(0.0 if signal.source == 'axis' else 0 for signal in SIGNALS), 0.0, 0.0, 0)
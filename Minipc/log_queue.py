@@ -0,0 +1,85 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import time
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Put records on the queue as they are, so they are formatted on the listener thread.
+
+    The stock QueueHandler formats every record on the calling thread. The
+    arguments of a record are kept by reference until it is written, so only
+    log immutable values (numbers, strings, tuples) from the hot paths.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=logging.INFO, fmt=None):
+    """Like logging.basicConfig, but the console is written from a background thread.
+
+    Logging calls only put the record on a queue. Does nothing if the root
+    logger already has handlers, e.g. when the caller configured logging.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(fmt or logging.BASIC_FORMAT))
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, console, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Writes out what is still queued
+
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(level)
+    return listener
+
+
+class TickLogger:
+    """Log a line of the control loop that would otherwise be written every tick.
+
+    Call ``log`` with the arguments of ``fmt`` on every tick. ``mode``:
+
+    * 'summary': one INFO line per ``interval`` seconds with the latest
+      arguments and the number of ticks since the previous line
+    * 'debug': every tick at DEBUG, nothing is formatted unless DEBUG is enabled
+    * 'every': every tick at INFO
+    * 'off': nothing
+    """
+
+    def __init__(self, fmt, mode='summary', interval=1.0, logger=None):
+        self.fmt = fmt
+        self.interval = interval
+        self.logger = logger or logging.getLogger()
+        self.summary_fmt = "%d ticks in %.1fs, last: " + fmt
+        self.ticks = 0
+        self.last_log = None
+        self.next_log = 0.0
+
+        if mode == 'summary':
+            self.log = self.summarize
+        elif mode == 'debug':
+            self.log = lambda *args: self.logger.debug(fmt, *args)
+        elif mode == 'every':
+            self.log = lambda *args: self.logger.info(fmt, *args)
+        elif mode == 'off':
+            self.log = lambda *args: None
+        else:
+            raise ValueError(f"Unknown tick logging mode {mode!r}")
+
+    def summarize(self, *args):
+        self.ticks += 1
+        now = time.monotonic()
+        if now < self.next_log:
+            return
+        elapsed = now - self.last_log if self.last_log is not None else 0.0
+        self.logger.info(self.summary_fmt, self.ticks, elapsed, *args)
+        self.ticks = 0
+        self.last_log = now
+        self.next_log = now + self.interval
@@ -0,0 +1,126 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import json
+import math
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Histogram:
+    """Histogram of durations in seconds with log-spaced buckets.
+
+    Recording is a bisect and two additions, cheap enough for the sampling and
+    publishing hot paths. Percentiles are estimated from the bucket bounds, so
+    they are accurate to roughly 12% with the default 20 buckets per decade.
+    """
+
+    def __init__(self, min_value=1e-6, max_value=10.0, buckets_per_decade=20):
+        buckets = int(math.ceil(math.log10(max_value / min_value) * buckets_per_decade))
+        self.bounds = [min_value * 10 ** (i / buckets_per_decade) for i in range(buckets + 1)]
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (0-100)."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(p / 100 * self.count)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+    def format_ms(self):
+        s = self.summary()
+        return (f"n={s['count']} p50={s['p50'] * 1000:.2f}ms p95={s['p95'] * 1000:.2f}ms "
+                f"p99={s['p99'] * 1000:.2f}ms max={s['max'] * 1000:.2f}ms")
+
+
+class Metrics:
+    """Named counters and histograms of one bridge process.
+
+    A snapshot is served as JSON on a local HTTP endpoint and/or written to
+    the log periodically, so timings can be inspected without a debugger.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def snapshot(self):
+        return {
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'histograms': {name: histogram.summary() for name, histogram in list(self.histograms.items())},
+        }
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve the snapshot as JSON on http://host:port/metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the bridge log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f"Metrics available on http://{host}:{port}/metrics")
+        return server
+
+    def log_every(self, interval):
+        """Write the snapshot to the log every ``interval`` seconds from a daemon thread."""
+        stopped = threading.Event()
+
+        def dump():
+            while not stopped.wait(interval):
+                logging.info(f"Metrics: {json.dumps(self.snapshot())}")
+
+        threading.Thread(target=dump, name='metrics-log', daemon=True).start()
+        return stopped
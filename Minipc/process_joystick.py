@@ -0,0 +1,128 @@
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+from joystick_state import INITIAL_STATE
+from sample_ring import SampleRing
+
+
+class ProcessJoystick:
+    """Sample the G29 in a process of its own and follow its samples in this one.
+
+    The sampler process runs a reader made by ``factory`` (a picklable
+    callable, e.g. the ``JoystickReader`` class) with its own interpreter,
+    so gRPC serialization and log formatting here cannot hold the GIL while
+    a sample is due. Every snapshot is written to a ``SampleRing`` in shared
+    memory, and a byte on a pipe wakes a thread here that takes the new
+    samples in order. Samples the ring lapped before they were taken are
+    counted in ``metrics`` as ``sampler_overruns``, the time from sampling
+    to being taken here as the histogram ``sampler_handover``.
+
+    Offers the part of the ``JoystickReader`` interface the publishers use
+    (``state``, ``isRunning``, ``listeners``, ``start``, ``stop`` and ``join``).
+    The listeners are called from the thread that follows the ring.
+    """
+
+    def __init__(self, factory, slots=1024, metrics=None):
+        self.ring = SampleRing(slots)
+        self.state = INITIAL_STATE
+        self.isRunning = True
+        self.listeners = []
+        self.metrics = metrics
+        self.handover = metrics.histogram('sampler_handover') if metrics is not None else None
+        self.nextSample = 0  # Index of the next sample to take from the ring
+        self.wakeupTimeout = 0.2  # Seconds to wait for a sample before checking on the sampler process
+
+        # Spawned, not forked: the child must not inherit this process' threads and locks
+        context = multiprocessing.get_context('spawn')
+        # Closing stopSender ends the sampler. Unlike an Event, that never waits for the sampler process,
+        # which may have ended already, e.g. without a joystick attached
+        self.stopReceiver, self.stopSender = context.Pipe(duplex=False)
+        self.wakeup, self.wakeupSender = context.Pipe(duplex=False)
+        self.process = context.Process(target=sample, name='joystick-sampler', daemon=True,
+                                       args=(factory, self.ring.name, slots, self.wakeupSender, self.stopReceiver))
+        self.thread = threading.Thread(target=self.follow, name='sample-ring', daemon=True)
+
+    def start(self):
+        self.process.start()
+        self.wakeupSender.close()  # The sampler's copy is the only one, the pipe ends with it
+        self.stopReceiver.close()  # Likewise, the sampler sees the pipe end once stopSender is closed
+        self.thread.start()
+
+    def follow(self):
+        """Take every new sample from the ring, until the sampler process ends."""
+        sampling = True
+        while sampling and self.isRunning:
+            if self.wakeup.poll(self.wakeupTimeout):
+                # Any number of wakeups, the ring says what is new. None at all: the sampler process ended
+                sampling = bool(os.read(self.wakeup.fileno(), 4096))
+            else:
+                sampling = self.process.is_alive()
+            self.takeSamples()
+        self.isRunning = False
+
+    def takeSamples(self):
+        written = self.ring.written
+        behind = written - self.nextSample
+        if behind > self.ring.slots:
+            self.overrun(behind - self.ring.slots)
+            self.nextSample = written - self.ring.slots
+        while self.nextSample < written:
+            state = self.ring.read(self.nextSample)
+            self.nextSample += 1
+            if state is None:
+                self.overrun(1)
+                continue
+            self.state = state
+            if self.handover is not None:
+                self.handover.record(time.monotonic() - state.timestamp)
+            for listener in self.listeners:
+                listener()
+
+    def overrun(self, lost):
+        logging.debug(f"Sampler overran the ring, {lost} samples lost")
+        if self.metrics is not None:
+            self.metrics.count('sampler_overruns', lost)
+
+    def stop(self):
+        self.isRunning = False
+        self.stopSender.close()
+
+    def join(self, timeout=None):
+        self.process.join(timeout)
+        self.thread.join(timeout)
+        self.ring.close()
+        self.ring.unlink()
+
+
+def sample(factory, ringName, slots, wakeup, stopReceiver):
+    """Body of the sampler process: run a reader and hand every snapshot over through the ring."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Stopped through the stop pipe by the publisher
+    ring = SampleRing(slots, ringName)
+    reader = factory()
+    os.set_blocking(wakeup.fileno(), False)
+
+    def handOver():
+        ring.write(reader.state)
+        try:
+            os.write(wakeup.fileno(), b'\0')
+        except BlockingIOError:
+            pass  # Wakeups are pending already
+
+    def stopWhenAsked():
+        # Nothing is ever sent, the pipe ends when the publisher stops or exits
+        try:
+            stopReceiver.recv_bytes()
+        except EOFError:
+            pass
+        reader.stop()
+
+    reader.listeners.append(handOver)
+    threading.Thread(target=stopWhenAsked, name='sampler-stop', daemon=True).start()
+    try:
+        reader.run()  # On this thread, the process exists for it
+    finally:
+        ring.close()
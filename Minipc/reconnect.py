@@ -0,0 +1,64 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import time
+import random
+import logging
+
+
+class Reconnector:
+    """Decide when to reconnect to the broker after the connection dropped.
+
+    The first attempt after a drop is immediate. Further consecutive
+    failures wait a random time up to ``base_delay * 2**n``, at most
+    ``max_delay`` ("full jitter"), so bridges that lost the broker together
+    do not come back in lockstep. Only a connection that served a call
+    (``succeeded``) resets the count, one that fails right after connecting
+    keeps backing off. After ``max_failures`` consecutive failures ``failed``
+    gives up, None retries forever.
+
+    Kept in ``metrics``, prefixed with ``name``: the counters
+    ``<name>_connection_errors`` and ``<name>_reconnects``, and the
+    histogram ``<name>_reconnect_time`` from the drop to the next
+    established connection.
+    """
+
+    def __init__(self, name, metrics=None, base_delay=0.05, max_delay=5.0, max_failures=None):
+        self.name = name
+        self.metrics = metrics
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+        self.failures = 0  # Consecutive failures since the last call that succeeded
+        self.down_since = None  # time.monotonic() of the drop, None while connected
+        self.reconnect_time = metrics.histogram(f'{name}_reconnect_time') if metrics is not None else None
+
+    def connected(self):
+        """Record an established connection."""
+        if self.down_since is None:
+            return
+        elapsed = time.monotonic() - self.down_since
+        self.down_since = None
+        logging.info(f"Reconnected to {self.name} after {elapsed * 1000:.0f} ms")
+        if self.metrics is not None:
+            self.metrics.count(f'{self.name}_reconnects')
+            self.reconnect_time.record(elapsed)
+
+    def succeeded(self):
+        """Record a call the connection served, which resets the consecutive failures."""
+        self.failures = 0
+
+    def failed(self, error):
+        """Record a dropped or failed connection, returns the seconds to wait before reconnecting or None to give up."""
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        self.failures += 1
+        if self.metrics is not None:
+            self.metrics.count(f'{self.name}_connection_errors')
+        if self.max_failures is not None and self.failures >= self.max_failures:
+            logging.critical(f"Connection to {self.name} failed {self.failures} times in a row, giving up: {error}")
+            return None
+        delay = 0.0 if self.failures == 1 else random.uniform(0.0, min(self.max_delay,
+                                                                       self.base_delay * 2 ** (self.failures - 1)))
+        logging.error(f"Connection to {self.name} failed: {error}. Reconnecting in {delay * 1000:.0f} ms "
+                      f"(attempt {self.failures})")
+        return delay
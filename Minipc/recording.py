@@ -0,0 +1,100 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import mmap
+import time
+import struct
+
+# File layout: a header, the names of the recorded signals, then one fixed-size
+# record per sample. A record is the seconds since the recording started
+# (float64), the sample's sequence number (uint32) and one float32 per signal,
+# the precision KUKSA carries them with: 52 bytes for the 10 G29 signals.
+MAGIC = b'G29REC\x00\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHdd')  # Magic, version, signal count, start wall time, start monotonic time
+NAME = struct.Struct('16s')
+
+
+def record_struct(count):
+    return struct.Struct(f'<dI{count}f')
+
+
+class Recorder:
+    """Append timestamped samples to a binary recording.
+
+    Records are written through the file's buffer and nothing is kept in
+    memory, so multi-hour recordings cost a constant amount of memory. After
+    a crash at most the unflushed tail is lost; a torn last record is ignored
+    when reading.
+    """
+
+    def __init__(self, path, names):
+        self.path = path
+        self.record = record_struct(len(names))
+        self.start_monotonic = time.monotonic()
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(names), time.time(), self.start_monotonic))
+        for name in names:
+            self.file.write(NAME.pack(name.encode()))
+        self.count = 0
+
+    def write(self, timestamp, seq, values):
+        """Append one sample taken at ``timestamp`` (time.monotonic())."""
+        self.file.write(self.record.pack(timestamp - self.start_monotonic, seq, *values))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+class Recording:
+    """Memory-mapped read access to a recording made by ``Recorder``.
+
+    Iterating yields ``(elapsed, seq, values)`` per sample, reading the
+    records straight from the mapping. Pass ``names`` to check that the
+    recording was made with the same signal table.
+    """
+
+    def __init__(self, path, names=None):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.start_time, self.start_monotonic = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a joystick recording (version {VERSION})")
+        self.names = tuple(NAME.unpack_from(self.map, HEADER.size + index * NAME.size)[0].rstrip(b'\0').decode()
+                           for index in range(count))
+        if names is not None and self.names != tuple(names):
+            raise ValueError(f"{path} was recorded with signals {self.names}, expected {tuple(names)}")
+        self.record = record_struct(count)
+        self.offset = HEADER.size + count * NAME.size
+        self.count = (len(self.map) - self.offset) // self.record.size
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        unpack = self.record.unpack_from
+        size = self.record.size
+        for position in range(self.offset, self.offset + self.count * size, size):
+            elapsed, seq, *values = unpack(self.map, position)
+            yield elapsed, seq, values
+
+    def close(self):
+        self.map.close()
+
+
+def replay(recording, speed=1.0):
+    """Yield the samples of ``recording`` with their recorded spacing, ``speed`` times faster.
+
+    Samples are due at absolute times from the first one, so the pace does not
+    drift with the consumer's cost. ``speed`` 0 yields them as fast as they
+    are consumed.
+    """
+    origin = None
+    for elapsed, seq, values in recording:
+        if speed:
+            if origin is None:
+                origin = time.monotonic() - elapsed / speed
+            delay = origin + elapsed / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield elapsed, seq, values
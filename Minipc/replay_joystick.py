@@ -0,0 +1,43 @@
+import time
+import logging
+import threading
+
+from joystick_state import INITIAL_STATE, JoystickState
+from recording import Recording, replay
+from signal_map import NAMES
+
+
+class ReplayJoystick(threading.Thread):
+    """Play a recording to the publisher in place of the G29.
+
+    Offers the part of the ``JoystickReader`` interface the publishers use
+    (``state``, ``isRunning``, ``listeners`` and ``stop``). Each replayed
+    sample becomes a new snapshot stamped with the time it is replayed at,
+    so the latency metrics measure the bridge and not the recording.
+    """
+
+    def __init__(self, path, speed=1.0):
+        super().__init__()
+        self.recording = Recording(path, NAMES)
+        self.speed = speed  # 1 replays in real time, N N times faster, 0 as fast as possible
+        self.state = INITIAL_STATE
+        self.isRunning = True
+        self.listeners = []
+        self.finishDelay = 1.0  # Seconds to keep running after the last sample so it gets published
+
+    def run(self):
+        logging.info(f"Replaying {len(self.recording)} samples at speed {self.speed or 'max'}")
+        for elapsed, seq, values in replay(self.recording, self.speed):
+            if not self.isRunning:
+                break
+            self.state = JoystickState(*values, time.monotonic(), time.time(), seq)
+            for listener in self.listeners:
+                listener()
+        else:
+            logging.info("Replay finished")
+            time.sleep(self.finishDelay)
+        self.isRunning = False
+        self.recording.close()
+
+    def stop(self):
+        self.isRunning = False
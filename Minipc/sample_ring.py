@@ -0,0 +1,80 @@
+import struct
+from multiprocessing import shared_memory
+
+from joystick_state import JoystickState
+from signal_map import SIGNALS
+
+# Shared memory layout: the number of samples written so far (uint64), then the
+# slots. Sample n goes to slot n % slots as n + 1 (uint64), the sample's
+# monotonic and wall clock time (float64), its sequence number (uint32), one
+# float64 per signal in signal table order, and n + 1 again.
+COUNTER = struct.Struct('<Q')
+SAMPLE = struct.Struct(f'<ddI{len(SIGNALS)}d')
+SLOT_SIZE = COUNTER.size + SAMPLE.size + COUNTER.size
+
+# Back from the float64 of the slot to the type the joystick state holds the signal as
+CONVERTERS = tuple(float if signal.source == 'axis' else int for signal in SIGNALS)
+
+
+class SampleRing:
+    """Ring buffer of joystick snapshots in shared memory, one writer and one reader process.
+
+    The writer fills a slot before it bumps the write count, so every slot
+    below the count holds a complete sample, unless the writer has lapped the
+    reader since. A slot is framed by its sample number before and after:
+    the writer writes them in that order, the reader reads them backwards,
+    so a slot that was overwritten while being read has mismatching numbers
+    and is reported as overrun. Samples are unpacked straight from the
+    shared memory, nothing is copied in between.
+
+    Creates a new block of shared memory, or attaches to the one called ``name``.
+    """
+
+    def __init__(self, slots=1024, name=None):
+        self.slots = slots
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=COUNTER.size + slots * SLOT_SIZE)
+            COUNTER.pack_into(self.memory.buf, 0, 0)
+        else:
+            self.memory = shared_memory.SharedMemory(name)
+        self.name = self.memory.name
+        self.buffer = self.memory.buf
+
+    @property
+    def written(self):
+        """Number of samples written so far."""
+        return COUNTER.unpack_from(self.buffer, 0)[0]
+
+    def offset(self, index):
+        return COUNTER.size + index % self.slots * SLOT_SIZE
+
+    def write(self, state):
+        """Append a snapshot, overwriting the oldest one once the ring is full. Writer side only."""
+        index = self.written
+        offset = self.offset(index)
+        buffer = self.buffer
+        count = len(SIGNALS)
+        COUNTER.pack_into(buffer, offset, index + 1)
+        SAMPLE.pack_into(buffer, offset + COUNTER.size, state.timestamp, state.time, state.seq, *state[:count])
+        COUNTER.pack_into(buffer, offset + COUNTER.size + SAMPLE.size, index + 1)
+        COUNTER.pack_into(buffer, 0, index + 1)
+
+    def read(self, index):
+        """The snapshot of sample ``index``, None if it was overwritten already."""
+        offset = self.offset(index)
+        buffer = self.buffer
+        if COUNTER.unpack_from(buffer, offset + COUNTER.size + SAMPLE.size)[0] != index + 1:
+            return None
+        timestamp, wall_time, seq, *values = SAMPLE.unpack_from(buffer, offset + COUNTER.size)
+        if COUNTER.unpack_from(buffer, offset)[0] != index + 1:
+            return None
+        return JoystickState(*(convert(value) for convert, value in zip(CONVERTERS, values)),
+                             timestamp, wall_time, seq)
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+
+    def unlink(self):
+        """Free the shared memory, once both processes are done with it."""
+        self.memory.unlink()
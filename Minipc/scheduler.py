@@ -0,0 +1,100 @@
+# Shared by the Minipc and CarMAker bridges, which are deployed separately.
+# Keep both copies of this file identical, tests/test_shared_modules.py checks them.
+import time
+import asyncio
+import logging
+
+from metrics import Histogram
+
+
+class RateScheduler:
+    """Pace a loop at a fixed rate against absolute deadlines.
+
+    Tick ``n`` is due at ``start + n * period`` however long the previous
+    ticks took, so the rate does not drift the way a ``sleep(period)`` after
+    the work does. When the work of a tick runs past the next deadline, that
+    is an overrun: the next tick starts immediately. Deadlines that were
+    missed completely are skipped, so the loop does not run a burst of
+    catch-up ticks. The lateness of every tick is reported every
+    ``report_interval`` seconds. Overruns, skipped ticks and the worst
+    lateness are also kept in ``metrics``, prefixed with ``name``.
+
+    Call ``start`` before the first tick and ``sleep`` (or ``sleep_async``)
+    at the end of every tick.
+    """
+
+    def __init__(self, rate_hz, name, metrics=None, report_interval=10.0):
+        self.rate = rate_hz
+        self.period = 1.0 / rate_hz
+        self.name = name
+        self.metrics = metrics
+        self.report_interval = report_interval
+        self.lateness = Histogram()  # Lateness of the ticks since the last report
+        self.deadline = None  # Deadline of the current tick
+        self.due = None  # Deadline the current tick was originally due at, before skipping
+        self.next_report = None
+        self.ticks = 0
+        self.overruns = 0  # Ticks whose work ran past the next deadline
+        self.skipped = 0  # Deadlines missed completely
+        self.worst_lateness = 0.0
+
+    def set_rate(self, rate_hz):
+        """Change the rate from the next deadline on."""
+        self.rate = rate_hz
+        self.period = 1.0 / rate_hz
+
+    def start(self):
+        """Make now the deadline of the first tick."""
+        self.deadline = self.due = time.monotonic()
+        self.next_report = self.deadline + self.report_interval
+
+    def advance(self, now):
+        """Move on to the next deadline and return the seconds left until it."""
+        self.deadline += self.period
+        self.due = self.deadline
+        late = now - self.deadline
+        if late < 0:
+            return -late
+
+        self.overruns += 1
+        missed = int(late // self.period)
+        if missed:
+            self.skipped += missed
+            self.deadline += missed * self.period
+        if self.metrics is not None:
+            self.metrics.count(f'{self.name}_overruns')
+            if missed:
+                self.metrics.count(f'{self.name}_ticks_skipped', missed)
+        return 0.0
+
+    def started(self, now):
+        """Record how late the tick starting now is against its deadline."""
+        lateness = max(0.0, now - self.due)
+        self.ticks += 1
+        self.lateness.record(lateness)
+        if lateness > self.worst_lateness:
+            self.worst_lateness = lateness
+            if self.metrics is not None:
+                self.metrics.gauge(f'{self.name}_worst_lateness', lateness)
+
+        if now >= self.next_report:
+            self.report()
+            self.next_report = now + self.report_interval
+
+    def sleep(self):
+        delay = self.advance(time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+        self.started(time.monotonic())
+
+    async def sleep_async(self):
+        delay = self.advance(time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.started(time.monotonic())
+
+    def report(self):
+        logging.info(f"{self.name} loop at {self.rate:g} Hz: lateness {self.lateness.format_ms()}, "
+                     f"{self.overruns} overruns, {self.skipped} ticks skipped, "
+                     f"worst {self.worst_lateness * 1000:.2f}ms")
+        self.lateness.reset()
@@ -0,0 +1,114 @@
+# Shared by the Minipc publisher and the CarMaker bridge, which are deployed separately.
+# Keep both copies identical, tests/test_shared_modules.py checks them.
+from collections import namedtuple
+
+# One row per signal on its way from the G29 to CarMaker
+Signal = namedtuple('Signal', [
+    'name',  # Field of the joystick state
+    'source',  # 'axis', 'button' or 'presses', the number of presses of a button
+    'index',  # Joystick axis or button number
+    'scale',  # Axes are published as round(raw * scale + offset, 3), buttons as 0/1, presses as a count
+    'offset',
+    'deadband',  # Minimum change before the signal is published again
+    'vss_path',  # KUKSA signal carrying it
+    'vss_type',  # Data type of vss_path on the broker, a kuksa_client DataType name
+    'quantity',  # CarMaker quantity it is written to, None to only publish it
+    'cm_scale',  # Written to CarMaker as the KUKSA value * cm_scale
+])
+
+# The VSS paths are stand-ins with a matching data type, e.g. the steering angle
+# travels as Vehicle.Speed and the reverse button as a brake pad wear. To write
+# the reverse button to CarMaker, set its quantity to 'DM.GearNo' (cm_scale -1
+# selects the reverse gear). Both sides must run the same table.
+#
+# A button's level only says whether it is held at the moment of a publish, so
+# a press shorter than the publish interval would be lost. Buttons that trigger
+# actions also get a 'presses' row: a counter incremented on every press, which
+# survives coalescing. Receivers act on the difference to the count they saw
+# last (see new_presses), so every press is acted on exactly once.
+SIGNALS = (
+    Signal('steering', 'axis', 0, -9.0, 0.0, 0.005, 'Vehicle.Speed', 'FLOAT', 'DM.Steer.Ang', 1.0),
+    Signal('gas', 'axis', 2, -0.5, 0.5, 0.005, 'Vehicle.OBD.RelativeThrottlePosition', 'FLOAT', 'DM.Gas', 1.0),
+    Signal('brake', 'axis', 3, -0.5, 0.5, 0.005, 'Vehicle.ADAS.CruiseControl.SpeedSet', 'FLOAT', 'DM.Brake', 1.0),
+    Signal('clutch', 'axis', 1, -0.5, 0.5, 0.005,
+           'Vehicle.Powertrain.Transmission.ClutchEngagement', 'FLOAT', 'DM.Clutch', 1.0),
+    Signal('handbrake', 'button', 4, 1.0, 0.0, 0,
+           'Vehicle.Chassis.Axle.Row1.Wheel.Right.Brake.PadWear', 'UINT8', 'DM.Handbrake', 1.0),
+    Signal('reverse', 'button', 5, 1.0, 0.0, 0,
+           'Vehicle.Chassis.Axle.Row2.Wheel.Left.Brake.PadWear', 'UINT8', None, -1.0),
+    Signal('enter', 'button', 6, 1.0, 0.0, 0, 'Vehicle.ADAS.CruiseControl.IsActive', 'BOOLEAN', None, 1.0),
+    Signal('exit', 'button', 7, 1.0, 0.0, 0, 'Vehicle.ADAS.CruiseControl.IsEnabled', 'BOOLEAN', None, 1.0),
+    Signal('enter_presses', 'presses', 6, 1.0, 0.0, 0, 'Vehicle.Powertrain.FuelSystem.Range', 'UINT32', None, 1.0),
+    Signal('exit_presses', 'presses', 7, 1.0, 0.0, 0, 'Vehicle.Powertrain.TractionBattery.Range', 'UINT32', None, 1.0),
+)
+
+# Carries the sequence number of the joystick sample a publish was built from
+SEQUENCE_SIGNAL = 'Vehicle.Powertrain.Range'
+SEQUENCE_TYPE = 'UINT32'
+
+# Root of the paths above. A publisher and the bridge rigs reading it can move them
+# under another root together (see under_root), e.g. one wheel per rig.
+VSS_ROOT = 'Vehicle'
+
+# Everything below is derived from SIGNALS once at import. Signals are referred
+# to by their position in SIGNALS, which is also their position in the joystick
+# state and in the value lists of both bridges.
+NAMES = tuple(signal.name for signal in SIGNALS)
+PATHS = tuple(signal.vss_path for signal in SIGNALS)
+POSITIONS = {signal.vss_path: position for position, signal in enumerate(SIGNALS)}  # KUKSA keys updates by path
+
+# Lazy %-format for logging one value per signal
+LOG_FORMAT = ", ".join(f"{signal.name.capitalize()}: %s" for signal in SIGNALS)
+
+
+def under_root(paths, root):
+    """Paths of the table under another VSS root, e.g. Rig2.Speed for Vehicle.Speed and the root 'Rig2'."""
+    if root == VSS_ROOT:
+        return list(paths)
+    return [root + path[len(VSS_ROOT):] for path in paths]
+
+
+def axis_converter(scale, offset, decimals=3):
+    return lambda raw: round(raw * scale + offset, decimals)
+
+
+def compile_inputs(signals=SIGNALS, decimals=3):
+    """Joystick side: {axis: (position, converter)}, {button: position} and {button: position of its press count}."""
+    axes = {}
+    buttons = {}
+    presses = {}
+    for position, signal in enumerate(signals):
+        if signal.source == 'axis':
+            axes[signal.index] = (position, axis_converter(signal.scale, signal.offset, decimals))
+        elif signal.source == 'presses':
+            presses[signal.index] = position
+        else:
+            buttons[signal.index] = position
+    return axes, buttons, presses
+
+
+PRESS_COUNT_MODULO = 1 << 32  # Press counts travel as UINT32 and wrap around
+# A count that went back, seen as a wrapped difference this large, was reset, e.g. by a restarted Minipc
+PRESS_COUNT_RESET = 1 << 31
+
+
+def new_presses(count, last):
+    """Presses since a press count of ``last``, 0 when there is none yet to compare with or the count was reset."""
+    if count is None or last is None:
+        return 0
+    presses = (int(count) - int(last)) % PRESS_COUNT_MODULO
+    return 0 if presses >= PRESS_COUNT_RESET else presses
+
+
+def compile_outputs(signals=SIGNALS):
+    """CarMaker side: (position, quantity name, converter) for every signal written to CarMaker."""
+    outputs = []
+    for position, signal in enumerate(signals):
+        if signal.quantity is None:
+            continue
+        if signal.cm_scale == 1:
+            convert = float
+        else:
+            convert = lambda value, cm_scale=signal.cm_scale: float(value) * cm_scale
+        outputs.append((position, signal.quantity, convert))
+    return tuple(outputs)
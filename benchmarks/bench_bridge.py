@@ -0,0 +1,256 @@
+"""End-to-end benchmark of the KUKSA to CarMaker bridge.
+
+Runs the real Minipc publisher (``ConnectToKuksa``) and CarMaker bridge
+(``KuksaReader`` and ``CarMakerController``) against an in-process stand-in
+broker and a fake CarMaker APO server, driven by a synthetic joystick. For
+every requested rate one JSON line is written to stdout with throughput,
+end-to-end latency percentiles and CPU time per update, e.g.::
+
+    python benchmarks/bench_bridge.py --rates 10 50 100 --duration 10 > results.jsonl
+
+No wheel, broker or CarMaker licence is needed.
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout machine-readable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'Minipc'), os.path.join(ROOT, 'CarMAker'), os.path.dirname(os.path.abspath(__file__))]
+
+from fake_broker import FakeBroker  # noqa: E402
+from fake_carmaker import FakeCarMaker  # noqa: E402
+
+
+class SyntheticJoystick(threading.Thread):
+    """Stands in for JoystickReader: turns the wheel by one step per sample.
+
+    The steering value of sample ``n`` is ``n`` itself (wrapped below 2**24, so
+    it survives KUKSA's 32-bit floats exactly), which lets the fake CarMaker
+    match every write back to the time the sample was taken.
+    """
+
+    def __init__(self, rate):
+        super().__init__(name='synthetic-joystick', daemon=True)
+        from joystick_state import INITIAL_STATE
+        self.state = INITIAL_STATE
+        self.isRunning = True
+        self.listeners = []
+        self.period = 1.0 / rate
+        self.sampled = {}  # Steering value -> monotonic sample time
+
+    def run(self):
+        next_sample = time.monotonic()
+        while self.isRunning:
+            now = time.monotonic()
+            seq = self.state.seq + 1
+            steering = float(seq % (1 << 24))
+            self.sampled[steering] = now
+            self.state = self.state._replace(steering=steering, timestamp=now, time=time.time(), seq=seq)
+            for listener in self.listeners:
+                listener()
+
+            next_sample += self.period
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.monotonic()
+
+    def stop(self):
+        self.isRunning = False
+
+
+class LoopThread(threading.Thread):
+    """Runs coroutines on one event loop, like the bridges do in production, until cancelled."""
+
+    def __init__(self, *make_coroutines):
+        super().__init__(name='bridge-loop', daemon=True)
+        self.make_coroutines = make_coroutines
+        self.loop = asyncio.new_event_loop()
+        self.tasks = []
+        self.errors = []
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.main())
+
+    async def main(self):
+        self.tasks = [asyncio.create_task(make()) for make in self.make_coroutines]
+        for result in await asyncio.gather(*self.tasks, return_exceptions=True):
+            if isinstance(result, Exception) and not isinstance(result, asyncio.CancelledError):
+                self.errors.append(f"{type(result).__name__}: {result}")
+
+    def cancel(self):
+        for task in self.tasks:
+            self.loop.call_soon_threadsafe(task.cancel)
+        self.join(timeout=5)
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def run_rate(rate, duration, warmup, publish_interval, control_rate, rigs, fast_path=False, adaptive_rate=None,
+             broker_delay=0.0, carmaker_delay=0.0):
+    import cm_transfer
+    import async_publisher
+    import CM_CONTROLLER as carmaker
+    import cm_async
+    from metrics import Histogram
+    from scheduler import RateScheduler
+    from rigs import Rig
+    from adaptive_rate import AdaptiveRate
+
+    latency = Histogram()
+    joystick = SyntheticJoystick(rate)
+    measuring = threading.Event()
+    delivered = [0] * rigs  # Per rig
+
+    def make_on_write(rig):
+        def on_write(name, value, received):
+            if name != 'DM.Steer.Ang':
+                return
+            sampled = joystick.sampled.get(value)
+            if sampled is not None and measuring.is_set():
+                latency.record(received - sampled)
+                delivered[rig] += 1
+        return on_write
+
+    broker = FakeBroker(set_delay=broker_delay)
+    broker_port = broker.start()
+    fake_cms = [FakeCarMaker(on_write=make_on_write(rig), reply_delay=carmaker_delay) for rig in range(rigs)]
+    # Every rig follows the same wheel; several rigs get ids so their metrics are kept apart
+    carmaker.RIGS = [Rig(None if rigs == 1 else f'rig{index}', '127.0.0.1', fake_cm.start(), 'Vehicle')
+                     for index, fake_cm in enumerate(fake_cms)]
+
+    sender = cm_transfer.ConnectToKuksa(joystick)
+    if adaptive_rate:
+        sender.rate = AdaptiveRate(*adaptive_rate, cm_transfer.metrics)
+    else:
+        publish_rate = 1.0 / publish_interval if publish_interval else math.inf
+        sender.rate = AdaptiveRate(publish_rate, publish_rate, cm_transfer.metrics)
+    carmaker.CONTROL_RATE_HZ = control_rate
+    fast_path_address = ('127.0.0.1', free_udp_port()) if fast_path else None
+    carmaker.FAST_PATH_PORT = fast_path_address[1] if fast_path else None
+    fast_path_sender = cm_transfer.fast_path_to(joystick, *fast_path_address) if fast_path else None
+    scheduler = RateScheduler(control_rate, 'control', carmaker.metrics) if control_rate else None
+    loop = LoopThread(
+        lambda: cm_async.run_bridge(
+            carmaker.build_fanout, carmaker.RIGS, carmaker.CARMAKER_BOOT_COMMANDS, '127.0.0.1', broker_port, scheduler,
+            fast_path_address,
+        ),
+        lambda: async_publisher.run_publisher(joystick, sender, '127.0.0.1', broker_port, cm_transfer.PUBLISH_TIMEOUT),
+    )
+
+    loop.start()
+    joystick.start()
+    try:
+        time.sleep(warmup)
+        for histogram in carmaker.metrics.histograms.values():
+            histogram.reset()
+        cm_transfer.metrics.histogram('publish_rtt').reset()
+        calls, publishes, lines = dict(broker.calls), broker.publishes, sum(cm.lines for cm in fake_cms)
+        measuring.set()
+        cpu_start, wall_start = time.process_time(), time.monotonic()
+
+        time.sleep(duration)
+
+        measuring.clear()
+        cpu = time.process_time() - cpu_start
+        elapsed = time.monotonic() - wall_start
+        calls = {rpc: count - calls.get(rpc, 0) for rpc, count in broker.calls.items()}
+        publishes, lines = broker.publishes - publishes, sum(cm.lines for cm in fake_cms) - lines
+    finally:
+        joystick.stop()
+        loop.cancel()
+        for fake_cm in fake_cms:
+            fake_cm.stop()
+        broker.stop()
+        if fast_path_sender is not None:
+            fast_path_sender.close()
+
+    updates = sum(delivered)
+    summary = latency.summary()
+    return {
+        'rate_hz': rate,
+        'publish_interval_s': publish_interval,
+        'control_rate_hz': control_rate,
+        'rigs': rigs,
+        'fast_path': fast_path,
+        'duration_s': round(elapsed, 3),
+        'samples': joystick.state.seq,
+        'updates_delivered': updates,
+        'updates_delivered_per_rig': delivered,
+        'throughput_per_s': updates / elapsed if elapsed else 0.0,
+        'broker_calls': calls,
+        'broker_datapoints': publishes,
+        'carmaker_round_trips': lines,
+        'latency_ms': {key: summary[key] * 1000 for key in ('mean', 'p50', 'p95', 'p99', 'max')},
+        'cpu_ms_per_update': cpu * 1000 / updates if updates else None,
+        'hops_ms': {
+            name: {key: value * 1000 if key != 'count' else value for key, value in histogram.summary().items()}
+            for name, histogram in carmaker.metrics.histograms.items()
+        },
+        'control_overruns': scheduler.overruns if scheduler else None,
+        'control_worst_lateness_ms': scheduler.worst_lateness * 1000 if scheduler else None,
+        'fast_path_counters': {name: count for name, count in carmaker.metrics.counters.items()
+                               if name.startswith('fast_path_') or name.endswith('updates_stale')},
+        'updates_coalesced': sum(count for name, count in carmaker.metrics.counters.items()
+                                 if name.endswith('updates_coalesced')),
+        'publish_rate_hz': None if math.isinf(sender.rate.rate) else sender.rate.rate,  # None: every sample
+        'publish_rtt_ms': {key: value * 1000 if key != 'count' else value
+                           for key, value in cm_transfer.metrics.histogram('publish_rtt').summary().items()},
+        'publish_errors': sender.rate.errors,
+        'errors': loop.errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rates', type=float, nargs='+', default=[10, 50, 100],
+                        help='Joystick sample rates to benchmark, in Hz')
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per rate')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to run before measuring')
+    parser.add_argument('--publish-interval', type=float, default=0.0,
+                        help='Minimum seconds between two publishes (1 / PUBLISH_RATE_HZ), 0 publishes every sample')
+    parser.add_argument('--control-rate', type=float, default=None,
+                        help='Write CarMaker at this fixed rate (CONTROL_RATE_HZ), default writes on every update')
+    parser.add_argument('--rigs', type=int, default=1, help='Fake CarMaker instances driven by the bridge')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='Also send the samples over the UDP fast path on loopback (FAST_PATH_PORT)')
+    parser.add_argument('--adaptive-rate', type=float, nargs=2, metavar=('MIN_HZ', 'MAX_HZ'),
+                        help='Adapt the publish rate between these bounds (ADAPTIVE_RATE) instead of --publish-interval')
+    parser.add_argument('--broker-delay', type=float, default=0.0,
+                        help='Seconds every Set call takes at the fake broker, to emulate a slow WAN link')
+    parser.add_argument('--carmaker-delay', type=float, default=0.0,
+                        help='Seconds every command takes at the fake CarMaker, to emulate a slow APO socket')
+    parser.add_argument('--output', help='Append the JSON lines to this file as well')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    # Configure logging before the bridge modules do, so their per-tick logs respect --log-level
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    for rate in args.rates:
+        line = json.dumps(run_rate(rate, args.duration, args.warmup, args.publish_interval, args.control_rate, args.rigs,
+                                   args.fast_path, args.adaptive_rate, args.broker_delay,
+                                   args.carmaker_delay), allow_nan=False)
+        print(line, flush=True)
+        if args.output:
+            with open(args.output, 'a') as output:
+                output.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""In-process stand-in for the KUKSA data broker.
+
+Implements the parts of the ``kuksa.val.v1`` and ``kuksa.val.v2`` VAL gRPC
+services the bridge's ``VSSClient`` uses (server info, metadata and value
+get, set/publish and subscribe), so both sides talk to it unchanged. Values
+are kept in memory and pushed to every subscriber of the changed paths;
+timestamps set by the provider are kept, like the real broker does.
+"""
+import time
+import queue
+import threading
+from concurrent import futures
+
+import grpc
+from kuksa.val.v1 import types_pb2 as types_v1, val_pb2 as val_v1, val_pb2_grpc as val_grpc_v1
+from kuksa.val.v2 import types_pb2 as types_v2, val_pb2 as val_v2, val_pb2_grpc as val_grpc_v2
+
+from signal_map import SEQUENCE_SIGNAL, SEQUENCE_TYPE, SIGNALS  # Shared table, put on the path by bench_bridge
+
+# VSS data types of the signals the bridge publishes (identical in v1 and v2)
+SIGNAL_TYPES = {signal.vss_path: types_v2.DataType.Value('DATA_TYPE_' + signal.vss_type) for signal in SIGNALS}
+SIGNAL_TYPES[SEQUENCE_SIGNAL] = types_v2.DataType.Value('DATA_TYPE_' + SEQUENCE_TYPE)
+
+
+def to_v1(datapoint):
+    """Convert a stored v2 datapoint to its v1 message, scalar values only."""
+    message = types_v1.Datapoint()
+    field = datapoint.value.WhichOneof('typed_value')
+    if field is not None:
+        setattr(message, field, getattr(datapoint.value, field))
+    if datapoint.HasField('timestamp'):
+        message.timestamp.CopyFrom(datapoint.timestamp)
+    return message
+
+
+def from_v1(message):
+    datapoint = types_v2.Datapoint()
+    field = message.WhichOneof('value')
+    if field is not None:
+        setattr(datapoint.value, field, getattr(message, field))
+    if message.HasField('timestamp'):
+        datapoint.timestamp.CopyFrom(message.timestamp)
+    return datapoint
+
+
+class FakeBroker:
+    def __init__(self, signal_types=None, set_delay=0.0):
+        self.signal_types = dict(signal_types or SIGNAL_TYPES)
+        self.set_delay = set_delay  # Seconds each set/publish call takes, to emulate a slow WAN link
+        self.ids = {path: index for index, path in enumerate(self.signal_types)}
+        self.values = {}  # Path -> types_v2.Datapoint
+        self.subscribers = []  # (set of paths, queue of lists of changed paths)
+        self.lock = threading.Lock()
+        self.publishes = 0  # Datapoints received through set/publish calls
+        self.calls = {}  # RPC name -> number of calls, to compare broker load
+        self.server = None
+        self.port = None
+
+    def start(self, host='127.0.0.1', port=0, workers=32):
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+        val_grpc_v1.add_VALServicer_to_server(V1Service(self), self.server)
+        val_grpc_v2.add_VALServicer_to_server(V2Service(self), self.server)
+        self.port = self.server.add_insecure_port(f'{host}:{port}')
+        self.server.start()
+        return self.port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop(grace=None)
+
+    def count(self, rpc):
+        self.calls[rpc] = self.calls.get(rpc, 0) + 1
+
+    def store(self, values):
+        """Store {path: types_v2.Datapoint} and notify the subscribers of those paths."""
+        with self.lock:
+            for path, datapoint in values.items():
+                if not datapoint.HasField('timestamp'):
+                    datapoint.timestamp.GetCurrentTime()
+                self.values[path] = datapoint
+            self.publishes += len(values)
+            for paths, changes in self.subscribers:
+                changed = [path for path in values if path in paths]
+                if changed:
+                    changes.put(changed)
+
+    def stream(self, paths, context, make_response):
+        """Yield one response per change of the subscribed paths, starting with their current values."""
+        changes = queue.Queue()
+        with self.lock:
+            changes.put(list(paths))
+            subscriber = (paths, changes)
+            self.subscribers.append(subscriber)
+        try:
+            while context.is_active():
+                try:
+                    changed = changes.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                with self.lock:
+                    current = {path: self.values.get(path) for path in changed}
+                yield make_response(current)
+        finally:
+            with self.lock:
+                self.subscribers.remove(subscriber)
+
+
+class V1Service(val_grpc_v1.VALServicer):
+    def __init__(self, broker):
+        self.broker = broker
+
+    def GetServerInfo(self, request, context):
+        self.broker.count('v1.GetServerInfo')
+        return val_v1.GetServerInfoResponse(name='fake-databroker', version='bench')
+
+    def Get(self, request, context):
+        self.broker.count('v1.Get')
+        entries = []
+        for entry in request.entries:
+            data_entry = types_v1.DataEntry(path=entry.path)
+            if entry.view == types_v1.VIEW_METADATA:
+                data_entry.metadata.data_type = self.broker.signal_types.get(entry.path, types_v1.DATA_TYPE_FLOAT)
+            elif entry.path in self.broker.values:
+                data_entry.value.CopyFrom(to_v1(self.broker.values[entry.path]))
+            entries.append(data_entry)
+        return val_v1.GetResponse(entries=entries)
+
+    def Set(self, request, context):
+        self.broker.count('v1.Set')
+        if self.broker.set_delay:
+            time.sleep(self.broker.set_delay)
+        self.broker.store({update.entry.path: from_v1(update.entry.value) for update in request.updates})
+        return val_v1.SetResponse()
+
+    def Subscribe(self, request, context):
+        self.broker.count('v1.Subscribe')
+
+        def response(current):
+            updates = []
+            for path, datapoint in current.items():
+                entry = types_v1.DataEntry(path=path)
+                if datapoint is not None:
+                    entry.value.CopyFrom(to_v1(datapoint))
+                updates.append(val_v1.EntryUpdate(entry=entry, fields=[types_v1.FIELD_VALUE]))
+            return val_v1.SubscribeResponse(updates=updates)
+
+        yield from self.broker.stream({entry.path for entry in request.entries}, context, response)
+
+
+class V2Service(val_grpc_v2.VALServicer):
+    def __init__(self, broker):
+        self.broker = broker
+
+    def GetServerInfo(self, request, context):
+        self.broker.count('v2.GetServerInfo')
+        return val_v2.GetServerInfoResponse(name='fake-databroker', version='bench')
+
+    def ListMetadata(self, request, context):
+        self.broker.count('v2.ListMetadata')
+        metadata = [
+            types_v2.Metadata(path=path, id=self.broker.ids[path], data_type=data_type)
+            for path, data_type in self.broker.signal_types.items()
+            if path == request.root or path.startswith(request.root + '.')
+        ]
+        return val_v2.ListMetadataResponse(metadata=metadata)
+
+    def PublishValue(self, request, context):
+        self.broker.count('v2.PublishValue')
+        datapoint = types_v2.Datapoint()
+        datapoint.CopyFrom(request.data_point)
+        self.broker.store({request.signal_id.path: datapoint})
+        return val_v2.PublishValueResponse()
+
+    def Subscribe(self, request, context):
+        self.broker.count('v2.Subscribe')
+
+        def response(current):
+            message = val_v2.SubscribeResponse()
+            for path, datapoint in current.items():
+                message.entries[path].CopyFrom(datapoint if datapoint is not None else types_v2.Datapoint())
+            return message
+
+        yield from self.broker.stream(set(request.signal_paths), context, response)
@@ -0,0 +1,86 @@
+"""TCP stand-in for the CarMaker APO command server.
+
+Speaks enough of the command protocol for the bridge: every ``\\r``
+terminated line is a Tcl script whose ``;`` separated commands are executed
+in order, and the line is answered with ``O<result>\\r\\n\\r\\n``. Supported
+commands are ``DVAWrite``, ``StartSim``, ``WaitForStatus``, ``list [DVARead
+<quantity>] ...`` (quantities never written read as 0) and the cockpit
+commands, which are accepted and ignored.
+"""
+import time
+import socketserver
+import threading
+
+
+class FakeCarMaker(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, on_write=None, start_delay=0.0, reply_delay=0.0):
+        super().__init__((host, port), CommandHandler)
+        self.on_write = on_write  # Called with (quantity name, value, monotonic arrival time) per DVAWrite
+        self.start_delay = start_delay  # Seconds WaitForStatus takes after StartSim, to emulate the sim booting
+        self.reply_delay = reply_delay  # Seconds every command line takes, to emulate a slow APO socket
+        self.status = 'idle'
+        self.started_at = None
+        self.quantities = {}  # Quantity name -> last value written
+        self.lines = 0  # Command lines received, i.e. socket round-trips
+        self.writes = 0  # DVAWrite commands received
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='fake-carmaker', daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, line, received):
+        self.lines += 1
+        result = '0'
+        for command in line.split(';'):
+            words = command.split()
+            if not words:
+                continue
+            if words[0] == 'list':
+                names = [word.strip('[]') for word in words[1:] if word.strip('[]') != 'DVARead']
+                result = ' '.join(repr(self.quantities.get(name, 0.0)) for name in names)
+            elif words[0] == 'DVAWrite':
+                name, value = words[1], float(words[2])
+                self.quantities[name] = value
+                self.writes += 1
+                if self.on_write is not None:
+                    self.on_write(name, value, received)
+            elif words[0] == 'StartSim':
+                self.status = 'running'
+                self.started_at = time.monotonic()
+            elif words[0] == 'WaitForStatus':
+                if self.started_at is not None:
+                    time.sleep(max(0.0, self.started_at + self.start_delay - time.monotonic()))
+                result = self.status
+            elif words[0] == 'SimStatus':
+                result = '0' if self.status == 'running' else '-1'
+        return result
+
+
+class CommandHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        buffer = b''
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            received = time.monotonic()
+            buffer += data
+            while b'\r' in buffer:
+                line, buffer = buffer.split(b'\r', 1)
+                if self.server.reply_delay:
+                    time.sleep(self.server.reply_delay)
+                result = self.server.execute(line.decode().strip(), received)
+                self.request.sendall(f'O{result}\r\n\r\n'.encode())
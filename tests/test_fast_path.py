@@ -0,0 +1,53 @@
+"""The fast path drops late datagrams but follows a sender that restarted."""
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('kuksa_client')
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'CarMAker')]
+
+from fast_path import DATAGRAM, MAGIC, VERSION, FastPathInput  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from signal_map import SEQUENCE_SIGNAL, SIGNALS  # noqa: E402
+
+
+class Receiver:
+    def __init__(self):
+        self.metrics = Metrics()
+        self.delivered = []
+        self.restarts = 0
+        self.input = FastPathInput(self.deliver, self.metrics, restarted=self.restarted)
+
+    def deliver(self, updates):
+        self.delivered.append(updates[SEQUENCE_SIGNAL].value)
+
+    def restarted(self):
+        self.restarts += 1
+
+    def send(self, session, seq):
+        now = time.time()
+        self.input.datagram_received(DATAGRAM.pack(MAGIC, VERSION, len(SIGNALS), session, seq, now, now,
+                                                   *[0.0] * len(SIGNALS)))
+
+
+def test_late_datagram_is_dropped():
+    receiver = Receiver()
+    for seq in (500, 499, 500, 501):
+        receiver.send(1, seq)
+    assert receiver.delivered == [500, 501]
+    assert receiver.metrics.counters['fast_path_late'] == 2
+    assert receiver.restarts == 0
+
+
+def test_restarted_sender_counts_from_the_start():
+    receiver = Receiver()
+    receiver.send(1, 500)
+    receiver.send(2, 1)  # Within the reorder window of the old session
+    receiver.send(2, 2)
+    assert receiver.delivered == [500, 1, 2]
+    assert receiver.metrics.counters['fast_path_restarts'] == 1
+    assert receiver.restarts == 1
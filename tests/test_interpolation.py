@@ -0,0 +1,96 @@
+"""Resampling the KUKSA snapshots onto the control ticks, with fixed timestamps."""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'CarMAker')]
+
+from interpolation import Interpolator, signal_limits  # noqa: E402
+from signal_map import NAMES, SIGNALS  # noqa: E402
+
+STEERING = NAMES.index('steering')
+GAS = NAMES.index('gas')
+HANDBRAKE = NAMES.index('handbrake')
+TRANSIT = 0.05  # From the Minipc's clock to this host's
+DELAY = 0.1
+
+
+def snapshot(steering=0.0, gas=0.0, handbrake=0):
+    values = [0] * len(SIGNALS)
+    values[STEERING], values[GAS], values[HANDBRAKE] = steering, gas, handbrake
+    return values
+
+
+def at(interpolator, playout):
+    """The values at ``playout`` on the Minipc's timeline."""
+    return interpolator.sample(playout + TRANSIT + DELAY)
+
+
+@pytest.fixture
+def interpolator():
+    return Interpolator(DELAY, max_extrapolation=0.1, max_gap=0.2)
+
+
+def add(interpolator, sampled, **values):
+    interpolator.add(sampled, sampled + TRANSIT, snapshot(**values))
+
+
+def test_nothing_before_the_first_snapshot(interpolator):
+    assert interpolator.sample(100.0) is None
+
+
+def test_holds_the_first_snapshot_until_playout_reaches_it(interpolator):
+    add(interpolator, 100.0, steering=1.0)
+    add(interpolator, 100.1, steering=2.0)
+    assert at(interpolator, 99.9)[STEERING] == 1.0
+
+
+def test_plays_out_delay_behind_the_wheel_between_snapshots(interpolator):
+    add(interpolator, 100.0, steering=0.0)
+    add(interpolator, 100.1, steering=1.0)
+    assert interpolator.sample(100.0 + TRANSIT + DELAY + 0.05)[STEERING] == pytest.approx(0.5)
+    assert at(interpolator, 100.025)[STEERING] == pytest.approx(0.25)
+
+
+def test_buttons_switch_at_the_snapshot_they_changed_in(interpolator):
+    add(interpolator, 100.0, handbrake=0)
+    add(interpolator, 100.1, handbrake=1)
+    assert at(interpolator, 100.09)[HANDBRAKE] == 0
+    assert at(interpolator, 100.11)[HANDBRAKE] == 1
+
+
+def test_extrapolates_along_the_last_slope_up_to_the_cap(interpolator):
+    add(interpolator, 100.0, steering=0.0)
+    add(interpolator, 100.1, steering=1.0)
+    assert at(interpolator, 100.15)[STEERING] == pytest.approx(1.5)
+    assert at(interpolator, 100.5)[STEERING] == pytest.approx(2.0)  # 0.1 s past the latest snapshot, then held
+
+
+def test_clamps_the_axes_to_their_range():
+    interpolator = Interpolator(DELAY, max_extrapolation=0.1, max_gap=0.2, limits=signal_limits())
+    add(interpolator, 100.0, gas=0.5)
+    add(interpolator, 100.1, gas=0.9)
+    assert at(interpolator, 100.2)[GAS] == 1.0
+
+
+def test_a_gap_holds_still_until_shortly_before_the_next_snapshot(interpolator):
+    add(interpolator, 100.0, steering=0.0)
+    add(interpolator, 101.0, steering=1.0)
+    assert at(interpolator, 100.5)[STEERING] == 0.0
+    assert at(interpolator, 100.8)[STEERING] == 0.0
+    assert at(interpolator, 100.9)[STEERING] == pytest.approx(0.5)
+
+
+def test_ignores_a_snapshot_older_than_the_latest(interpolator):
+    add(interpolator, 100.0, steering=0.0)
+    add(interpolator, 100.1, steering=1.0)
+    add(interpolator, 100.05, steering=9.0)
+    assert at(interpolator, 100.05)[STEERING] == pytest.approx(0.5)
+
+
+def test_maps_the_clocks_by_the_shortest_transit(interpolator):
+    interpolator.add(100.0, 100.3, snapshot(steering=0.0))  # Delayed on the way
+    add(interpolator, 100.1, steering=1.0)
+    assert interpolator.offset == pytest.approx(TRANSIT)
@@ -0,0 +1,86 @@
+"""Every press of a toggle button is acted on once, however the publishes fall."""
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'Minipc')]
+
+from signal_map import NAMES, PRESS_COUNT_MODULO, SIGNALS, new_presses  # noqa: E402
+
+ENTER = NAMES.index('enter')
+ENTER_PRESSES = NAMES.index('enter_presses')
+ENTER_BUTTON = SIGNALS[ENTER].index
+
+
+def test_no_presses_before_a_count_to_compare_with():
+    assert new_presses(5, None) == 0
+    assert new_presses(None, 5) == 0
+
+
+def test_presses_since_the_last_count():
+    assert new_presses(7, 5) == 2
+    assert new_presses(5, 5) == 0
+
+
+def test_presses_across_the_wrap():
+    assert new_presses(2, PRESS_COUNT_MODULO - 1) == 3
+
+
+def test_count_that_went_back_is_a_reset():
+    assert new_presses(0, 500) == 0
+    assert new_presses(1, PRESS_COUNT_MODULO // 2) == 0
+
+
+@pytest.fixture
+def reader():
+    pytest.importorskip('kuksa_client')
+    pytest.importorskip('pygame')
+    import cm_transfer
+    return cm_transfer.JoystickReader()
+
+
+def press(reader, changes):
+    reader.setButton(changes, ENTER_BUTTON, 1)
+    reader.setButton(changes, ENTER_BUTTON, 0)
+
+
+def test_two_presses_in_one_event_batch(reader):
+    changes = {}
+    press(reader, changes)
+    press(reader, changes)
+    reader.publish(changes, time.monotonic())
+    assert reader.state[ENTER_PRESSES] == 2
+    assert reader.state[ENTER] == 0
+
+
+def test_press_and_release_between_publishes(reader):
+    published = reader.state[ENTER_PRESSES]
+    for pressed in (1, 0):
+        changes = {}
+        reader.setButton(changes, ENTER_BUTTON, pressed)
+        reader.publish(changes, time.monotonic())
+    # The publish after the release only sees the button up, but the count went on
+    assert reader.state[ENTER] == 0
+    assert new_presses(reader.state[ENTER_PRESSES], published) == 1
+
+
+def test_held_button_counts_once(reader):
+    changes = {}
+    reader.setButton(changes, ENTER_BUTTON, 1)
+    reader.publish(changes, time.monotonic())
+    changes = {}
+    reader.setButton(changes, ENTER_BUTTON, 1)  # A poll of the held button
+    reader.publish(changes, time.monotonic())
+    assert reader.state[ENTER_PRESSES] == 1
+
+
+def test_press_count_wraps(reader):
+    reader.state = reader.state._replace(enter_presses=PRESS_COUNT_MODULO - 1)
+    changes = {}
+    press(reader, changes)
+    reader.publish(changes, time.monotonic())
+    assert reader.state[ENTER_PRESSES] == 0
+    assert new_presses(0, PRESS_COUNT_MODULO - 1) == 1
@@ -0,0 +1,141 @@
+"""A wheel at rest must not look like stale input to the CarMaker bridge.
+
+While the wheel rests, the Minipc only sends heartbeats of the snapshot of
+the last movement. They are aged on the bridge like any update, so they
+must carry the time they were sent, not the time of that movement.
+"""
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('kuksa_client')
+pytest.importorskip('pygame')
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'Minipc'), str(ROOT / 'CarMAker')]
+
+import cm_transfer  # noqa: E402
+from deadline import InputDeadline  # noqa: E402
+from joystick_state import INITIAL_STATE  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from signal_map import SEQUENCE_SIGNAL, SIGNALS  # noqa: E402
+
+STALE_TIMEOUT = 0.3
+HEARTBEAT_INTERVAL = 0.1
+
+
+class RestingWheel:
+    isRunning = True
+
+    def __init__(self, rested_for):
+        # Last moved rested_for seconds ago
+        self.state = INITIAL_STATE._replace(timestamp=time.monotonic() - rested_for, time=time.time() - rested_for,
+                                            seq=7)
+        self.listeners = []
+
+
+def subscription(updates):
+    """The published updates as the bridge's subscription sees them."""
+    return {update.entry.path: update.entry.value for update in updates}
+
+
+def received(updates):
+    """The published updates as the bridge's subscription sees them, without the sequence signal."""
+    datapoints = subscription(updates)
+    datapoints.pop(SEQUENCE_SIGNAL)
+    return datapoints
+
+
+def heartbeat(sender, state):
+    sender.delta_filter.resync()  # Due now
+    return received(sender.next_updates(state))
+
+
+@pytest.fixture
+def sender():
+    wheel = RestingWheel(rested_for=10.0)
+    sender = cm_transfer.ConnectToKuksa(wheel)
+    sender.next_updates(wheel.state)  # The initial zeros
+    sender.next_updates(wheel.state)  # The publish tick that saw the last movement
+    return sender
+
+
+@pytest.fixture
+def deadline():
+    return InputDeadline(0.5, STALE_TIMEOUT, {'gas': 0.0, 'brake': 0.3}, 0.5, Metrics())
+
+
+def test_resting_wheel_does_not_engage_failsafe(sender, deadline):
+    state = sender.joystick_reader.state
+    last_written = state[:len(SIGNALS)]
+    end = time.monotonic() + 2 * STALE_TIMEOUT
+    while time.monotonic() < end:
+        assert deadline.arrived(heartbeat(sender, state), time.time())
+        assert deadline.failsafe(last_written, time.monotonic()) is None
+        time.sleep(HEARTBEAT_INTERVAL)
+    assert deadline.metrics.counters.get('deadline_misses', 0) == 0
+    assert deadline.metrics.counters.get('input_stale', 0) == 0
+
+
+def test_failsafe_engages_without_heartbeats(sender, deadline):
+    state = sender.joystick_reader.state
+    last_written = state[:len(SIGNALS)]
+    assert deadline.arrived(heartbeat(sender, state), time.time())
+    values = deadline.failsafe(last_written, time.monotonic() + STALE_TIMEOUT + 0.1)
+    assert values is not None
+    assert deadline.metrics.counters['input_stale'] == 1
+
+
+def test_late_new_sample_misses_the_deadline(sender, deadline):
+    state = sender.joystick_reader.state
+    moved = state._replace(seq=state.seq + 1, gas=0.5)  # A new sample, taken 10 seconds ago
+    assert not deadline.arrived(received(sender.next_updates(moved)), time.time())
+    assert deadline.metrics.counters['deadline_misses'] == 1
+
+
+def test_deadline_misses_are_logged_with_their_age_once_per_interval(sender, deadline, caplog):
+    state = sender.joystick_reader.state
+    for seq in (state.seq + 1, state.seq + 2):
+        deadline.arrived(received(sender.next_updates(state._replace(seq=seq, gas=seq / 100))), time.time())
+    assert deadline.metrics.counters['deadline_misses'] == 2
+    misses = [record.getMessage() for record in caplog.records if 'over the budget' in record.getMessage()]
+    assert len(misses) == 1
+    assert misses[0].startswith('Update 10')  # About 10 seconds old
+
+
+class CarMaker:
+    def subscribe(self, quantity):
+        pass
+
+    def send(self, command):
+        return 'O\r\n'
+
+
+def test_resting_wheel_does_not_engage_failsafe_with_fast_path(sender, monkeypatch):
+    pytest.importorskip('pycarmaker')
+    import CM_CONTROLLER as bridge
+    from fast_path import DATAGRAM, MAGIC, VERSION, FastPathInput
+
+    monkeypatch.setattr(bridge, 'FAST_PATH_PORT', 0)
+    monkeypatch.setattr(bridge, 'STALE_TIMEOUT', STALE_TIMEOUT)
+    monkeypatch.setattr(bridge, 'metrics', Metrics())
+    reader = bridge.KuksaReader(bridge.CarMakerController(CarMaker()), bridge.RIGS[0])
+    state = sender.joystick_reader.state
+
+    # The last movement arrived over UDP when it happened, its KUKSA copies come as heartbeats
+    fast_path = FastPathInput(reader.handle_updates, bridge.metrics)
+    fast_path.datagram_received(DATAGRAM.pack(MAGIC, VERSION, len(SIGNALS), 1, state.seq, time.time(), time.time(),
+                                              *state[:len(SIGNALS)]))
+    reader.write_pending()
+    end = time.monotonic() + 2 * STALE_TIMEOUT
+    while time.monotonic() < end:
+        sender.delta_filter.resync()
+        reader.handle_updates(subscription(sender.next_updates(state)))
+        reader.write_pending()  # Where the fail-safe is checked
+        time.sleep(HEARTBEAT_INTERVAL)
+
+    assert bridge.metrics.counters.get('input_stale', 0) == 0
+    assert bridge.metrics.counters['updates_stale'] > 0
+    assert reader.last_written == tuple(state[:len(SIGNALS)])
@@ -0,0 +1,33 @@
+"""The modules shared by the two bridges must not drift apart.
+
+Minipc/ and CarMAker/ are deployed separately, so the modules both use are
+kept as a copy in each. A shared module says so in its header; both copies
+must exist and be identical.
+"""
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+BRIDGES = (ROOT / 'Minipc', ROOT / 'CarMAker')
+MARKER = '# Keep both copies'
+
+
+def shared_modules():
+    names = set()
+    for bridge in BRIDGES:
+        for path in bridge.glob('*.py'):
+            if MARKER in ''.join(path.read_text().splitlines(keepends=True)[:3]):
+                names.add(path.name)
+    return sorted(names)
+
+
+def test_shared_modules_are_found():
+    assert 'signal_map.py' in shared_modules()
+
+
+@pytest.mark.parametrize('name', shared_modules())
+def test_copies_are_identical(name):
+    minipc, carmaker = (bridge / name for bridge in BRIDGES)
+    assert minipc.exists() and carmaker.exists(), f"{name} is shared but only one bridge has it"
+    assert minipc.read_bytes() == carmaker.read_bytes(), f"Minipc/{name} and CarMAker/{name} differ"